@@ -0,0 +1,436 @@
+import os
+import pickle
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from weakref import WeakSet
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+L1_MAX_ENTRIES: int = 500
+SYNC_INTERVAL: float = 0
+CULL_EVERY: int = 100
+TOMBSTONE_LIMIT: int = 10000
+ACCESS_RESOLUTION: float = 60
+BUSY_TIMEOUT: float = 5
+STALE_FACTOR: int = 5
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB, expires REAL, '
+    'accessed REAL NOT NULL, stamp INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_stamp ON cache (stamp)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)',
+    "INSERT OR IGNORE INTO meta VALUES ('stamp', 0), ('purged', 0)",
+)
+ALIVE = '(value IS NOT NULL AND (expires IS NULL OR expires > ?))'
+
+_instances = WeakSet()
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кеш: маленький LRU в памяти (L1) перед общим для всех
+    процессов хоста файлом SQLite в режиме WAL (L2). Django создает
+    отдельный экземпляр кеша в каждом потоке, поэтому L1 свой у каждого
+    потока, а не у процесса.
+
+    Каждая запись в L2 получает штамп - следующее значение общего
+    счетчика поколений. Перед операцией экземпляр читает ключи со штампом
+    больше последнего увиденного и выбрасывает их из L1, поэтому запись
+    или удаление в одном потоке или процессе видны остальным без внешнего
+    демона. Удаление оставляет надгробие, чтобы его тоже было видно по
+    штампу; старые надгробия вычищаются, и экземпляр, отставший сильнее,
+    сбрасывает L1 целиком.
+
+    OPTIONS: MAX_ENTRIES и CULL_FREQUENCY ограничивают L2 (вытесняются
+    давно не читанные записи), L1_MAX_ENTRIES - L1, SYNC_INTERVAL -
+    как часто (в секундах) сверяться со штампами L2: в пределах интервала
+    чтение из L1 может не видеть чужую запись. CULL_EVERY - L2 чистится
+    в среднем раз в столько записей, а не при каждой, поэтому между
+    чистками в нем бывает чуть больше MAX_ENTRIES записей.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.l1_max_entries = int(
+            options.get('L1_MAX_ENTRIES', L1_MAX_ENTRIES)
+        )
+        self.sync_interval = float(
+            options.get('SYNC_INTERVAL', SYNC_INTERVAL)
+        )
+        self.cull_every = int(options.get('CULL_EVERY', CULL_EVERY))
+        self._l1 = OrderedDict()
+        self._lock = Lock()
+        self._seen = None
+        self._synced_at = 0
+        self._connection = None
+        _instances.add(self)
+
+    def _after_fork(self):
+        """
+        Процесс, созданный fork, не пользуется соединением и блокировкой
+        родителя: открывает свои.
+        """
+        self._connection = None
+        self._lock = Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.location,
+                timeout=BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def _meta(self, name):
+        return self.connection.execute(
+            'SELECT value FROM meta WHERE name = ?', (name,)
+        ).fetchone()[0]
+
+    def _next_stamp(self):
+        """Следующий штамп. Вызывается внутри BEGIN IMMEDIATE."""
+        self.connection.execute(
+            "UPDATE meta SET value = value + 1 WHERE name = 'stamp'"
+        )
+        return self._meta('stamp')
+
+    def _write(self, operation, *args):
+        """Выполняет operation в транзакции с блокировкой на запись."""
+        with self._lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                result = operation(*args)
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+            return result
+
+    def _sync(self):
+        """Выбрасывает из L1 ключи, измененные в L2 другими процессами."""
+        now = time.monotonic()
+        recent = now - self._synced_at < self.sync_interval
+        if self._seen is not None and recent:
+            return
+        with self._lock:
+            self._synced_at = now
+            if self._seen is None or self._seen < self._meta('purged'):
+                self._l1.clear()
+                self._seen = self._meta('stamp')
+                return
+            rows = self.connection.execute(
+                'SELECT key, stamp FROM cache WHERE stamp > ?', (self._seen,)
+            ).fetchall()
+            for key, stamp in rows:
+                entry = self._l1.get(key)
+                if entry is not None and entry[2] != stamp:
+                    del self._l1[key]
+                self._seen = max(self._seen, stamp)
+
+    def _remember(self, key, value, expires, stamp):
+        with self._lock:
+            self._l1[key] = (value, expires, stamp)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _from_l1(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry
+
+    def _load(self, keys):
+        """Читает живые записи L2 и кладет их в L1."""
+        now = time.time()
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = self.connection.execute(
+                f'SELECT key, value, expires, accessed, stamp FROM cache '
+                f'WHERE key IN ({placeholders}) AND {ALIVE}',
+                (*chunk, now),
+            ).fetchall()
+            stale = []
+            for key, value, expires, accessed, stamp in rows:
+                found[key] = pickle.loads(value)
+                self._remember(key, found[key], expires, stamp)
+                if now - accessed > ACCESS_RESOLUTION:
+                    stale.append(key)
+            if stale:
+                # Время чтения для LRU обновляется не чаще раза
+                # в ACCESS_RESOLUTION секунд, чтобы чтения не писали в L2.
+                self.connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in stale],
+                )
+        return found
+
+    def _store(self, key, value, timeout):
+        expires = self.get_backend_timeout(timeout)
+        stamp = self._next_stamp()
+        self.connection.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+            (
+                key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                expires,
+                time.time(),
+                stamp,
+            ),
+        )
+        return expires, stamp
+
+    def _cull(self):
+        now = time.time()
+        self.connection.execute(
+            'DELETE FROM cache WHERE value IS NOT NULL '
+            'AND expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        count = self.connection.execute(
+            'SELECT COUNT(*) FROM cache WHERE value IS NOT NULL'
+        ).fetchone()[0]
+        if count > self._max_entries:
+            self.connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'WHERE value IS NOT NULL ORDER BY accessed LIMIT ?)',
+                (max(count // self._cull_frequency, 1),),
+            )
+        horizon = self._meta('stamp') - TOMBSTONE_LIMIT
+        if horizon > self._meta('purged'):
+            self.connection.execute(
+                'DELETE FROM cache WHERE value IS NULL AND stamp <= ?',
+                (horizon,),
+            )
+            self.connection.execute(
+                "UPDATE meta SET value = ? WHERE name = 'purged'", (horizon,)
+            )
+
+    def _set_many(self, items, timeout):
+        stored = {
+            key: (value, *self._store(key, value, timeout))
+            for key, value in items.items()
+        }
+        if random.randrange(max(self.cull_every, 1)) == 0:
+            self._cull()
+        return stored
+
+    def _tombstone(self, keys):
+        stamp = self._next_stamp()
+        self.connection.executemany(
+            'UPDATE cache SET value = NULL, expires = 0, stamp = ? '
+            'WHERE key = ?',
+            [(stamp, key) for key in keys],
+        )
+
+    def _forget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._sync()
+        entry = self._from_l1(key)
+        if entry is not None:
+            return entry[0]
+        return self._load([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        made = {}
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = key
+        found, missing = {}, []
+        for made_key, key in made.items():
+            entry = self._from_l1(made_key)
+            if entry is None:
+                missing.append(made_key)
+            else:
+                found[key] = entry[0]
+        for made_key, value in self._load(missing).items():
+            found[made[made_key]] = value
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items[key] = value
+        stored = self._write(self._set_many, items, timeout)
+        for key, (value, expires, stamp) in stored.items():
+            self._remember(key, value, expires, stamp)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        def add():
+            exists = self.connection.execute(
+                f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+                (key, time.time()),
+            ).fetchone()
+            if exists:
+                return None
+            return self._set_many({key: value}, timeout)
+
+        stored = self._write(add)
+        if stored is None:
+            return False
+        self._remember(key, *stored[key])
+        return True
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._sync()
+        if self._from_l1(key) is not None:
+            return True
+        return self.connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        def incr():
+            row = self.connection.execute(
+                'SELECT value, expires FROM cache '
+                f'WHERE key = ? AND {ALIVE}',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            stamp = self._next_stamp()
+            self.connection.execute(
+                'UPDATE cache SET value = ?, stamp = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), stamp, key),
+            )
+            return value, row[1], stamp
+
+        value, expires, stamp = self._write(incr)
+        self._remember(key, value, expires, stamp)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        def touch():
+            stamp = self._next_stamp()
+            return self.connection.execute(
+                'UPDATE cache SET expires = ?, stamp = ? '
+                f'WHERE key = ? AND {ALIVE}',
+                (self.get_backend_timeout(timeout), stamp, key, time.time()),
+            ).rowcount
+
+        self._forget([key])
+        return bool(self._write(touch))
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        made = []
+        for key in keys:
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            made.append(key)
+        if made:
+            self._write(self._tombstone, made)
+            self._forget(made)
+
+    def clear(self):
+        def clear():
+            stamp = self._next_stamp()
+            self.connection.execute('DELETE FROM cache')
+            self.connection.execute(
+                "UPDATE meta SET value = ? WHERE name = 'purged'", (stamp,)
+            )
+
+        self._write(clear)
+        with self._lock:
+            self._l1.clear()
+
+    def close(self, **kwargs):
+        """Соединение с L2 живет все время работы процесса."""
+
+
+def get_or_set_stale(
+    key, compute, timeout, cache=None, generation=None, on_stale=None
+):
+    """
+    Значение из кеша с защитой от одновременного пересчета.
+    Значение хранится вместе со сроком свежести timeout, поколением
+    generation и еще STALE_FACTOR сроков после него. Когда срок истек
+    или поколение сменилось, пересчет запускает только процесс, взявший
+    блокировку (cache.add), а остальные до его окончания отдают прежнее
+    значение. Поэтому поколение передается отдельно, а не входит в ключ:
+    с новым ключом прежнего значения не было бы. Без прежнего значения
+    считают все: отдать нечего. Если отдано прежнее значение, вызывается
+    on_stale(), чтобы вызывающий не закешировал результат как свежий.
+    """
+    cache = cache or default_cache
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until, entry_generation = entry
+        if time.time() < fresh_until and entry_generation == generation:
+            return value
+        if not cache.add(lock_key, True, timeout):
+            if on_stale is not None:
+                on_stale()
+            return value
+    try:
+        value = compute()
+        cache.set(
+            key,
+            (value, time.time() + timeout, generation),
+            timeout * (STALE_FACTOR + 1),
+        )
+    finally:
+        if entry is not None:
+            cache.delete(lock_key)
+    return value
+
+
+def _after_fork():
+    for instance in list(_instances):
+        instance._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -9,7 +9,8 @@ class CreatedModel(models.Model):
     """Абстрактная модель. Добавляет дату создания и автора."""
     pub_date = models.DateTimeField(
         'Дата создания',
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True,
     )
     author = models.ForeignKey(
         User,
@@ -0,0 +1,41 @@
+from django import template
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, **params):
+    """
+    Ссылка на другую страницу списка с сохранением текущих GET-параметров
+    (например, поискового запроса).
+    """
+    query = context['request'].GET.copy()
+    for key, value in params.items():
+        query[key] = value
+    return f'?{query.urlencode()}'
+
+
+@register.filter
+def page_window(page_obj, on_each_side=2):
+    """
+    Ограниченный набор номеров страниц вокруг текущей: первая,
+    последняя и on_each_side соседних. Пропуск больше одной страницы
+    заменяется на None.
+    """
+    number = page_obj.number
+    last = page_obj.paginator.num_pages
+    window = range(
+        max(number - on_each_side, 1), min(number + on_each_side, last) + 1
+    )
+    pages = []
+    if window[0] > 3:
+        pages.extend((1, None))
+    else:
+        pages.extend(range(1, window[0]))
+    pages.extend(window)
+    if last - window[-1] > 2:
+        pages.extend((None, last))
+    else:
+        pages.extend(range(window[-1] + 1, last + 1))
+    return pages
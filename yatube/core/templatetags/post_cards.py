@@ -0,0 +1,60 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import get_thumbnails
+from posts.utils import latest_comments
+
+register = template.Library()
+
+CARD_TEMPLATE: str = 'posts/includes/post_card.html'
+CARD_CACHE_TIMEOUT: int = 60 * 60 * 24
+
+
+def card_cache_key(post):
+    """
+    Ключ карточки поста. updated_at меняется при каждом изменении поста
+    и при добавлении, изменении и удалении его комментариев (см.
+    signals.touch_commented_post).
+    """
+    return f'posts:card:{post.id}:{post.updated_at.timestamp()}'
+
+
+@register.simple_tag
+def post_cards(posts):
+    """
+    HTML карточек постов страницы, словарь {id поста: html}.
+    Карточки читаются из кеша одним get_many, рендерятся только
+    отсутствующие; их миниатюры и последние комментарии выбираются
+    одним пакетом на страницу (get_thumbnails, latest_comments).
+    """
+    posts = list(posts)
+    keys = {card_cache_key(post): post for post in posts}
+    cards = cache.get_many(keys)
+    missing = {key: post for key, post in keys.items() if key not in cards}
+    thumbnails = get_thumbnails(
+        [post.image for post in missing.values()], 'card'
+    )
+    comments = latest_comments(missing.values())
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'thumbnail': thumbnails.get(post.image.name),
+            'comments': comments.get(post.id, []),
+        })
+        for key, post in missing.items()
+    }
+    if missing:
+        cache.set_many(missing, getattr(
+            settings, 'POSTS_CARD_CACHE_TIMEOUT', CARD_CACHE_TIMEOUT
+        ))
+        cards.update(missing)
+    return {post.id: mark_safe(cards[key]) for key, post in keys.items()}
+
+
+@register.filter
+def card(cards, post):
+    """Карточка поста из результата post_cards."""
+    return cards[post.id]
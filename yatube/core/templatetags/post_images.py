@@ -0,0 +1,17 @@
+from django import template
+
+from posts.thumbnails import get_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, alias):
+    """
+    Готовая миниатюра изображения поста или None. Миниатюры создаются
+    в фоне после сохранения поста (posts.thumbnails), во время запроса
+    они только ищутся.
+
+        {% post_thumbnail post.image 'detail' as im %}
+    """
+    return get_thumbnail(image, alias)
@@ -0,0 +1,81 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import get_or_set_stale
+
+register = template.Library()
+
+
+class StaleCacheNode(template.Node):
+    def __init__(
+        self, nodelist, expire_time, fragment_name, vary_on, generation
+    ):
+        self.nodelist = nodelist
+        self.expire_time = expire_time
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.generation = generation
+
+    def render(self, context):
+        try:
+            expire_time = int(self.expire_time.resolve(context))
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                f'"stale_cache" tag got a non-integer timeout value: '
+                f'{self.expire_time.token!r}'
+            )
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on],
+        )
+        generation = None
+        if self.generation is not None:
+            generation = self.generation.resolve(context)
+        request = context.get('request')
+
+        def mark_stale():
+            # Страница с устаревшим фрагментом не должна попасть в кеш
+            # страниц под ETag нового поколения (см. page_cache).
+            if request is not None:
+                request.stale_fragments = True
+
+        return get_or_set_stale(
+            key,
+            lambda: self.nodelist.render(context),
+            expire_time,
+            generation=generation,
+            on_stale=mark_stale,
+        )
+
+
+@register.tag
+def stale_cache(parser, token):
+    """
+    Как {% cache %}, но с защитой от одновременного пересчета:
+    после истечения срока фрагмент перерисовывает один запрос,
+    остальные отдают прежнюю версию (см. core.cache.get_or_set_stale).
+    generation=... не входит в ключ: смена поколения делает фрагмент
+    устаревшим так же, как истекший срок.
+
+        {% stale_cache [expire_time] [fragment_name] [var1] [var2] ..
+                       [generation=value] %}
+            ...
+        {% endstale_cache %}
+    """
+    nodelist = parser.parse(('endstale_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    generation = None
+    if len(tokens) > 3 and tokens[-1].startswith('generation='):
+        generation = parser.compile_filter(tokens.pop()[len('generation='):])
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return StaleCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        generation,
+    )
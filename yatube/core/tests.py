@@ -1,6 +1,13 @@
+import os
+import shutil
+import tempfile
+import time
 from http import HTTPStatus
 
-from django.test import TestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase
+
+from .cache import TieredCache, get_or_set_stale
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +18,116 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Тестируем двухуровневый кеш на двух экземплярах (процессах)."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        location = os.path.join(self.directory, 'cache.sqlite3')
+        params = {'OPTIONS': {
+            'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 5, 'CULL_EVERY': 1
+        }}
+        self.first = TieredCache(location, params)
+        self.second = TieredCache(location, params)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_writes_are_visible_to_other_process(self):
+        """Запись, изменение и удаление видны другому экземпляру."""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.set('key', 'new value')
+        self.assertEqual(self.second.get('key'), 'new value')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+        self.assertTrue(self.second.add('key', 'added'))
+        self.assertFalse(self.first.add('key', 'ignored'))
+        self.assertEqual(self.first.get('key'), 'added')
+
+    def test_incr_and_clear(self):
+        """incr атомарен между экземплярами, clear сбрасывает оба L1."""
+        self.first.set('generation', 1)
+        self.assertEqual(self.second.get('generation'), 1)
+        self.first.incr('generation')
+        self.assertEqual(self.second.incr('generation'), 3)
+        self.assertEqual(self.first.get('generation'), 3)
+        with self.assertRaises(ValueError):
+            self.first.incr('missing')
+        self.second.clear()
+        self.assertIsNone(self.first.get('generation'))
+
+    def test_ttl_and_lru_eviction(self):
+        """Истекшие записи не отдаются, лишние вытесняются по LRU."""
+        self.first.set('short', 'value', timeout=-1)
+        self.assertIsNone(self.second.get('short'))
+        self.first.set_many({f'key-{i}': i for i in range(6)})
+        self.assertEqual(
+            len(self.second.get_many([f'key-{i}' for i in range(6)])), 5
+        )
+
+    def test_sync_interval_bounds_staleness(self):
+        """В пределах SYNC_INTERVAL L1 не сверяется с L2."""
+        lagging = TieredCache(
+            self.first.location, {'OPTIONS': {'SYNC_INTERVAL': 60}}
+        )
+        self.first.set('key', 'value')
+        self.assertEqual(lagging.get('key'), 'value')
+        self.first.set('key', 'new value')
+        self.assertEqual(lagging.get('key'), 'value')
+        lagging._synced_at -= 60
+        self.assertEqual(lagging.get('key'), 'new value')
+
+
+class StaleCacheTests(SimpleTestCase):
+    """Тестируем защиту от одновременного пересчета."""
+
+    def setUp(self):
+        self.cache = LocMemCache('stale-cache-tests', {})
+        self.calls = []
+
+    def compute(self):
+        self.calls.append(True)
+        return f'value {len(self.calls)}'
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Свежее значение берется из кеша."""
+        get_or_set_stale('key', self.compute, 20, self.cache)
+        value = get_or_set_stale('key', self.compute, 20, self.cache)
+        self.assertEqual(value, 'value 1')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока пересчет у другого процесса, отдается прежнее значение."""
+        self.cache.set('key', ('old', time.time() - 1, None))
+        self.cache.add('key:lock', True)
+        value = get_or_set_stale('key', self.compute, 20, self.cache)
+        self.assertEqual(value, 'old')
+        self.assertEqual(self.calls, [])
+        self.cache.delete('key:lock')
+        value = get_or_set_stale('key', self.compute, 20, self.cache)
+        self.assertEqual(value, 'value 1')
+        self.assertIsNone(self.cache.get('key:lock'))
+
+    def test_new_generation_is_stale(self):
+        """
+        Новое поколение пересчитывает значение под тем же ключом,
+        а пока пересчет у другого процесса, отдается прежнее.
+        """
+        get_or_set_stale('key', self.compute, 20, self.cache, generation=1)
+        self.cache.add('key:lock', True)
+        value = get_or_set_stale(
+            'key', self.compute, 20, self.cache, generation=2
+        )
+        self.assertEqual(value, 'value 1')
+        self.cache.delete('key:lock')
+        value = get_or_set_stale(
+            'key', self.compute, 20, self.cache, generation=2
+        )
+        self.assertEqual(value, 'value 2')
+        value = get_or_set_stale(
+            'key', self.compute, 20, self.cache, generation=2
+        )
+        self.assertEqual(value, 'value 2')
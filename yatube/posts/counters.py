@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+RECOUNT_BATCH_SIZE: int = 500
+USER_COUNTERS: dict = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+POST_COUNTERS: dict = {
+    'comments_count': (Comment, 'post'),
+}
+
+
+def counted(model, field):
+    """Коррелированный подзапрос: сколько строк model ссылается на OuterRef."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def adjust(queryset, field, delta):
+    """
+    Атомарно изменяет счетчик field на delta выражением F().
+    Счетчик не уходит ниже нуля, даже если успел разойтись с данными.
+    """
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def adjust_user(user_id, field, delta):
+    """Изменяет счетчик пользователя."""
+    adjust(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def adjust_post(post_id, field, delta):
+    """Изменяет счетчик поста."""
+    adjust(Post.objects.filter(id=post_id), field, delta)
+
+
+def actual_user_counts(queryset):
+    """Точные значения счетчиков для пользователей queryset."""
+    return queryset.annotate(**{
+        field: counted(model, lookup)
+        for field, (model, lookup) in USER_COUNTERS.items()
+    })
+
+
+def get_user_stats(user):
+    """
+    Счетчики пользователя. Если строки еще нет (пользователь создан
+    в обход сигналов), она создается с точными значениями.
+    """
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        counts = actual_user_counts(User.objects.filter(pk=user.pk)).values(
+            *USER_COUNTERS
+        ).get()
+        stats, _ = UserStats.objects.get_or_create(user=user, defaults=counts)
+        return stats
+
+
+def recount_users(batch_size=RECOUNT_BATCH_SIZE, dry_run=False):
+    """
+    Сверяет счетчики пользователей с данными порциями по batch_size
+    и исправляет расхождения. Возвращает число исправленных строк.
+    """
+    fixed = 0
+    users = actual_user_counts(User.objects.order_by('pk')).values(
+        'pk', *USER_COUNTERS
+    )
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return fixed
+            last_pk = batch[-1]['pk']
+            stats = UserStats.objects.select_for_update().in_bulk(
+                [row['pk'] for row in batch]
+            )
+            missing, changed = [], []
+            for row in batch:
+                actual = {field: row[field] for field in USER_COUNTERS}
+                current = stats.get(row['pk'])
+                if current is None:
+                    missing.append(UserStats(user_id=row['pk'], **actual))
+                elif any(
+                    getattr(current, field) != value
+                    for field, value in actual.items()
+                ):
+                    for field, value in actual.items():
+                        setattr(current, field, value)
+                    changed.append(current)
+            if not dry_run:
+                UserStats.objects.bulk_create(missing)
+                UserStats.objects.bulk_update(changed, list(USER_COUNTERS))
+        fixed += len(missing) + len(changed)
+
+
+def recount_posts(batch_size=RECOUNT_BATCH_SIZE, dry_run=False):
+    """То же, что recount_users, для счетчиков постов."""
+    fixed = 0
+    posts = Post.objects.order_by('pk').annotate(**{
+        f'actual_{field}': counted(model, lookup)
+        for field, (model, lookup) in POST_COUNTERS.items()
+    }).only('pk', *POST_COUNTERS)
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return fixed
+            last_pk = batch[-1].pk
+            changed = []
+            for post in batch:
+                if any(
+                    getattr(post, field) != getattr(post, f'actual_{field}')
+                    for field in POST_COUNTERS
+                ):
+                    for field in POST_COUNTERS:
+                        setattr(post, field, getattr(post, f'actual_{field}'))
+                    changed.append(post)
+            if not dry_run:
+                Post.objects.bulk_update(changed, list(POST_COUNTERS))
+        fixed += len(changed)
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+
+COUNT_CACHE_TIMEOUT: int = 60 * 60
+
+
+def count_cache_key(scope, value=None):
+    """Ключ кеша для количества постов в списке scope (index, group...)."""
+    return f'posts:count:{scope}:{value}'
+
+
+class ExactCount:
+    """Точное количество: SELECT COUNT(*) на каждый запрос."""
+
+    def __call__(self, queryset, key=None):
+        return queryset.count()
+
+
+class CachedCount(ExactCount):
+    """
+    Количество из кеша. Ключи сбрасываются сигналами при создании
+    и удалении постов и изменении подписок.
+    """
+
+    def __call__(self, queryset, key=None):
+        if key is None:
+            return super().__call__(queryset)
+        timeout = getattr(
+            settings, 'POSTS_COUNT_CACHE_TIMEOUT', COUNT_CACHE_TIMEOUT
+        )
+        return cache.get_or_set(count_cache_key(*key), queryset.count, timeout)
+
+
+class EstimatedCount(CachedCount):
+    """
+    Оценка количества всей ленты по статистике sqlite_stat1 (собирается
+    ANALYZE) - числу строк таблицы. Для группы, автора и подписок
+    статистика дает только среднее по всем значениям, а не размер
+    списка, поэтому они считаются как в CachedCount. Если статистики
+    нет, количество тоже берется из кеша.
+    """
+
+    def __call__(self, queryset, key=None):
+        estimate = None
+        if key is not None and key[0] == 'index':
+            estimate = self.estimate(queryset.model._meta.db_table)
+        if estimate is None:
+            return super().__call__(queryset, key)
+        return estimate
+
+    @staticmethod
+    def estimate(table):
+        if connection.vendor != 'sqlite':
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    (table,),
+                )
+                row = cursor.fetchone()
+        except DatabaseError:
+            return None
+        if row is None:
+            return None
+        return int(row[0].split()[0])
+
+
+COUNT_STRATEGIES: dict = {
+    'exact': ExactCount,
+    'cached': CachedCount,
+    'estimated': EstimatedCount,
+}
+
+
+def count_posts(queryset, key=None):
+    """
+    Количество постов в queryset по стратегии POSTS_PAGINATOR_COUNT.
+    key - пара (scope, значение), например ('group', group.id),
+    определяет ключ кеша и статистику для оценки.
+    """
+    strategy = getattr(settings, 'POSTS_PAGINATOR_COUNT', 'exact')
+    return COUNT_STRATEGIES[strategy]()(queryset, key)
+
+
+def invalidate_counts(*keys):
+    """Сбрасывает закешированные количества для пар (scope, значение)."""
+    cache.delete_many([count_cache_key(*key) for key in keys])
@@ -1,5 +1,8 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from .images import normalize_upload
 from .models import Comment, Post
 
 
@@ -9,6 +12,23 @@ class PostForm(ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """
+        Новое изображение нормализуется до сохранения (см. images).
+        Файл, который Pillow не может декодировать целиком (например,
+        обрезанный), не проходит проверку.
+        """
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            try:
+                return normalize_upload(image)
+            except OSError:
+                raise ValidationError(
+                    self.fields['image'].error_messages['invalid_image'],
+                    code='invalid_image',
+                )
+        return image
+
 
 class CommentForm(ModelForm):
     """Форма добавления комментария к посту."""
@@ -0,0 +1,64 @@
+import time
+
+from django.core.cache import cache
+
+
+def generation_key(scope, value=None):
+    """Ключ счетчика поколения для области scope (index, group, author...)."""
+    return f'posts:generation:{scope}:{value}'
+
+
+def initial_generation():
+    """
+    Начальное поколение - текущее время в миллисекундах. Если счетчик
+    вытеснен из кеша, новое значение больше всех прежних, и старые
+    фрагменты не могут случайно совпасть с новыми ключами.
+    """
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """
+    Текущие поколения для пар (scope, значение) одним get_many.
+    Отсутствующие счетчики создаются.
+    """
+    keys = [generation_key(*scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    for key in missing:
+        cache.add(key, initial_generation(), None)
+    if missing:
+        found.update(cache.get_many(missing))
+    return [found[key] for key in keys]
+
+
+def get_generation(scope, value=None):
+    """Текущее поколение одной области."""
+    return get_generations((scope, value))[0]
+
+
+def versioned_key(name, *scopes):
+    """Ключ кеша name, меняющийся при сбросе любой из областей scopes."""
+    generations = '.'.join(map(str, get_generations(*scopes)))
+    return f'{name}:{generations}'
+
+
+def bump(*scopes):
+    """
+    Сбрасывает закешированное для областей scopes: ключи с прежними
+    поколениями больше не запрашиваются и вытесняются по таймауту.
+    """
+    for scope in set(scopes):
+        key = generation_key(*scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, initial_generation(), None)
+
+
+def post_scopes(post):
+    """Области, которые затрагивает изменение поста."""
+    scopes = [('index', None), ('author', post.author_id), ('post', post.id)]
+    if post.group is not None:
+        scopes.append(('group', post.group.slug))
+    return scopes
@@ -0,0 +1,108 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps
+
+IMAGE_MAX_SIZE: int = 2048
+IMAGE_QUALITY: int = 85
+IMAGE_EXTENSIONS: tuple = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+# Форматы, которые перекодируются; остальные (например, анимированные
+# GIF) сохраняются как есть.
+NORMALIZED_FORMATS: tuple = ('JPEG', 'PNG', 'WEBP')
+
+
+def image_max_size():
+    return getattr(settings, 'POSTS_IMAGE_MAX_SIZE', IMAGE_MAX_SIZE)
+
+
+def image_quality():
+    return getattr(settings, 'POSTS_IMAGE_QUALITY', IMAGE_QUALITY)
+
+
+def image_paths(path):
+    """Пути изображений каталога path, рекурсивно и по порядку имен."""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def needs_normalizing(image):
+    """Изображение больше POSTS_IMAGE_MAX_SIZE или содержит EXIF."""
+    if image.format not in NORMALIZED_FORMATS:
+        return False
+    return (
+        max(image.size) > image_max_size()
+        or 'exif' in image.info
+        or bool(image.getexif())
+    )
+
+
+def normalize(source, target):
+    """
+    Записывает изображение source в target: поворачивает по EXIF,
+    уменьшает до POSTS_IMAGE_MAX_SIZE по большей стороне и перекодирует
+    в том же формате без метаданных. Если нормализовать нечего,
+    возвращает False и target не трогает.
+    """
+    with Image.open(source) as original:
+        if not needs_normalizing(original):
+            return False
+        format_ = original.format
+        limit = image_max_size()
+        # JPEG сразу декодируется в уменьшенном масштабе, без полного
+        # растра в памяти.
+        original.draft(original.mode, (limit, limit))
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((limit, limit), Image.LANCZOS)
+        options = {'quality': image_quality(), 'optimize': True}
+        if format_ == 'JPEG':
+            options['progressive'] = True
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+        image.save(target, format=format_, **options)
+    return True
+
+
+def normalize_upload(upload):
+    """
+    Нормализованная копия загруженного файла во временном файле на диске
+    или сам файл, если нормализовать нечего.
+    """
+    target = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+    upload.seek(0)
+    try:
+        changed = normalize(upload, target)
+    except BaseException:
+        target.close()
+        raise
+    if not changed:
+        target.close()
+        upload.seek(0)
+        return upload
+    target.seek(0)
+    return File(target, name=upload.name)
+
+
+def normalize_copy(path):
+    """
+    Нормализованная копия файла path во временном файле. Возвращает путь
+    копии или None, если нормализовать нечего. Исходный файл не меняется:
+    в хранилище по хешу новое содержимое получает новое имя.
+    """
+    descriptor, temp_path = tempfile.mkstemp(
+        suffix=os.path.splitext(path)[1], dir=settings.FILE_UPLOAD_TEMP_DIR
+    )
+    try:
+        with os.fdopen(descriptor, 'wb') as target:
+            changed = normalize(path, target)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    if not changed:
+        os.remove(temp_path)
+        return None
+    return temp_path
@@ -0,0 +1,148 @@
+import random
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts.bench import percentile
+from posts.counters import recount_users
+from posts.models import Follow, Post
+from posts.timeline import fan_out_limit, follow_feed, rebuild
+from posts.utils import PAGE_NOTES_LIMIT, CountedPaginator
+
+User = get_user_model()
+
+ZIPF_EXPONENT: float = 1.2
+PERCENTILES: tuple = (50, 99)
+
+
+def choose_authors(authors, count, distribution, rng):
+    """
+    Выбирает count разных авторов. uniform - все авторы равновероятны,
+    zipf - вероятность падает со степенью ранга, и несколько авторов
+    собирают большую часть подписчиков.
+    """
+    if distribution == 'uniform':
+        return rng.sample(authors, count)
+    weights = [
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, len(authors) + 1)
+    ]
+    chosen = set()
+    while len(chosen) < count:
+        chosen.update(rng.choices(authors, weights, k=count - len(chosen)))
+    return list(chosen)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50 и p99 времени сборки первой страницы ленты подписок '
+        'и публикации поста для схем push, pull и hybrid на синтетических '
+        'распределениях подписчиков. Данные создаются в транзакции, '
+        'которая затем откатывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--readers', type=int, default=500)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=50,
+            help='Количество подписок одного читателя.',
+        )
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=20,
+            help='Количество постов одного автора.',
+        )
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Порог подписчиков для hybrid, по умолчанию из настроек.',
+        )
+        parser.add_argument(
+            '--distribution',
+            choices=('uniform', 'zipf'),
+            action='append',
+            help='Распределение подписок, можно указать несколько раз.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        limit = options['limit']
+        modes = (
+            ('push', options['readers'] + 1),
+            ('pull', -1),
+            ('hybrid', fan_out_limit() if limit is None else limit),
+        )
+        for distribution in options['distribution'] or ('uniform', 'zipf'):
+            with transaction.atomic():
+                authors, readers = self.populate(distribution, rng, options)
+                for mode, mode_limit in modes:
+                    with override_settings(
+                        POSTS_FAN_OUT_FOLLOWER_LIMIT=mode_limit
+                    ):
+                        self.report(
+                            distribution,
+                            mode,
+                            self.measure(authors, readers, rng, options),
+                        )
+                transaction.set_rollback(True)
+
+    def populate(self, distribution, rng, options):
+        for role, count in (('author', 'authors'), ('reader', 'readers')):
+            User.objects.bulk_create(
+                User(username=f'bench-{role}-{i}')
+                for i in range(options[count])
+            )
+        authors, readers = (
+            list(User.objects.filter(
+                username__startswith=f'bench-{role}-'
+            ).order_by('id'))
+            for role in ('author', 'reader')
+        )
+        follows = min(options['follows'], len(authors))
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author)
+            for reader in readers
+            for author in choose_authors(authors, follows, distribution, rng)
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author)
+            for author in authors
+            for i in range(options['posts'])
+        )
+        recount_users()
+        return authors, readers
+
+    def measure(self, authors, readers, rng, options):
+        for reader in readers:
+            rebuild(reader.id)
+        queryset = Post.objects.select_related('group', 'author')
+        reads, writes = [], []
+        for _ in range(options['samples']):
+            reader = rng.choice(readers)
+            started = perf_counter()
+            paginator = CountedPaginator(
+                follow_feed(reader.id, queryset), PAGE_NOTES_LIMIT
+            )
+            list(paginator.get_page(1))
+            reads.append(perf_counter() - started)
+            started = perf_counter()
+            Post.objects.create(text='Новый пост', author=rng.choice(authors))
+            writes.append(perf_counter() - started)
+        return {'read': reads, 'write': writes}
+
+    def report(self, distribution, mode, timings):
+        parts = [f'{distribution:<8} {mode:<7}']
+        for operation, values in timings.items():
+            for percent in PERCENTILES:
+                milliseconds = percentile(values, percent) * 1000
+                parts.append(f'{operation} p{percent} {milliseconds:8.2f} ms')
+        self.stdout.write('  '.join(parts))
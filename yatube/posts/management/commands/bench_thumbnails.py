@@ -0,0 +1,81 @@
+import os
+from io import BytesIO
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageOps
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from posts.bench import percentile
+from posts.images import image_paths
+from posts.thumbnails import MAIN_FORMAT, THUMBNAIL_GEOMETRIES, variants
+
+
+def encode(image, size, format_):
+    """
+    Обрезка по центру с увеличением (как crop="center" upscale=True)
+    и кодирование. Возвращает размер результата в байтах.
+    """
+    buffer = BytesIO()
+    ImageOps.fit(image, size, Image.LANCZOS).save(
+        buffer,
+        format=format_,
+        quality=thumbnail_settings.THUMBNAIL_QUALITY,
+        progressive=thumbnail_settings.THUMBNAIL_PROGRESSIVE,
+        optimize=True,
+    )
+    return buffer.tell()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время обработки и размер каждого варианта миниатюры '
+        '(ширины и форматы srcset) на выборке изображений и сравнивает '
+        'их с одной основной миниатюрой в JPEG.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.MEDIA_ROOT, 'posts'),
+            help='Каталог с исходными изображениями.',
+        )
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument(
+            '--alias', choices=sorted(THUMBNAIL_GEOMETRIES), default='card'
+        )
+
+    def handle(self, *args, **options):
+        paths = list(islice(image_paths(options['path']), options['limit']))
+        if not paths:
+            raise CommandError(f'Нет изображений в {options["path"]}')
+        timings, sizes = {}, {}
+        for path in paths:
+            with Image.open(path) as source:
+                image = source.convert('RGB')
+            for width, format_, geometry, _ in variants(options['alias']):
+                size = tuple(map(int, geometry.split('x')))
+                started = perf_counter()
+                length = encode(image, size, format_)
+                timings.setdefault((width, format_), []).append(
+                    perf_counter() - started
+                )
+                sizes.setdefault((width, format_), []).append(length)
+        main = max(
+            variant for variant in sizes if variant[1] == MAIN_FORMAT
+        )
+        main_bytes = sum(sizes[main])
+        self.stdout.write(
+            f'Изображений: {len(paths)}, миниатюра {options["alias"]}'
+        )
+        for variant in sorted(sizes):
+            width, format_ = variant
+            total = sum(sizes[variant])
+            self.stdout.write(
+                f'{width:>5} {format_:<5} '
+                f'p50 {percentile(timings[variant], 50) * 1000:.1f} мс, '
+                f'средний размер {total / len(paths) / 1024:.1f} КБ, '
+                f'экономия {100 * (1 - total / main_bytes):.0f}%'
+            )
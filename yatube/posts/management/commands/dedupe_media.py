@@ -0,0 +1,74 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.media import (
+    GC_BATCH_SIZE, IMAGES_DIRECTORY, image_names, image_storage,
+    queue_image_deletion
+)
+from posts.models import Post
+from posts.thumbnails import submit_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит уже загруженные изображения постов на хранение по хешу '
+        'содержимого (ContentHashStorage): одинаковые файлы сливаются '
+        'в один, ссылки постов обновляются, прежние файлы и их миниатюры '
+        'удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=GC_BATCH_SIZE)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать файлы и освобождаемое место.',
+        )
+        parser.add_argument(
+            '--skip-thumbnails',
+            action='store_true',
+            help='Не создавать миниатюры для новых имен.',
+        )
+
+    def handle(self, *args, **options):
+        moved = merged = missing = saved = 0
+        targets = set()
+        for name in image_names(options['batch_size']):
+            if not image_storage.exists(name):
+                missing += 1
+                continue
+            with image_storage.open(name) as content:
+                source_name = os.path.join(
+                    IMAGES_DIRECTORY, os.path.basename(name)
+                )
+                target = image_storage.hashed_name(source_name, content)
+                if target == name:
+                    continue
+                duplicate = (
+                    target in targets or image_storage.exists(target)
+                )
+                targets.add(target)
+                if not duplicate and not options['dry_run']:
+                    image_storage.save(source_name, content)
+            if duplicate:
+                merged += 1
+                saved += image_storage.size(name)
+            else:
+                moved += 1
+            if options['dry_run']:
+                continue
+            with transaction.atomic():
+                Post.objects.filter(image=name).update(
+                    image=target, updated_at=timezone.now()
+                )
+                queue_image_deletion(name)
+            if not duplicate and not options['skip_thumbnails']:
+                submit_thumbnails(target)
+        verb = 'Будет' if options['dry_run'] else 'Готово'
+        self.stdout.write(
+            f'{verb}: перенесено {moved}, слито дубликатов {merged} '
+            f'({saved / 1024:.1f} КБ), нет на диске {missing}'
+        )
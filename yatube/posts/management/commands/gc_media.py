@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+
+from posts.media import (
+    GC_BATCH_SIZE, GC_GRACE_PERIOD, batches, delete_images, orphaned_images,
+    orphaned_thumbnails
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет медиафайлы с базой: удаляет изображения, на которые не '
+        'ссылается ни один пост, их миниатюры и файлы миниатюр без записи '
+        'в kvstore sorl-thumbnail. Каталоги читаются и сверяются пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=GC_BATCH_SIZE)
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=GC_GRACE_PERIOD,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать лишние файлы.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size, grace = options['batch_size'], options['grace']
+        images = thumbnails = 0
+        for batch in batches(orphaned_images(batch_size, grace), batch_size):
+            if options['dry_run']:
+                images += len(batch)
+            else:
+                images += delete_images(batch, grace)
+        # Миниатюры удаленных изображений уже исчезли из kvstore.
+        for name in orphaned_thumbnails(batch_size, grace):
+            thumbnails += 1
+            if not options['dry_run']:
+                default.storage.delete(name)
+        verb = 'Лишних' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            f'{verb} изображений: {images}, миниатюр: {thumbnails}'
+        )
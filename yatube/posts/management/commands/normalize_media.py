@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts.images import needs_normalizing, normalize_copy
+from posts.media import (
+    GC_BATCH_SIZE, IMAGES_DIRECTORY, image_names, image_storage,
+    queue_image_deletion
+)
+from posts.models import Post
+from posts.thumbnails import submit_thumbnails
+
+CHUNK_SIZE: int = 16
+
+
+def check_path(path):
+    """Нужно ли нормализовать файл; None, если это не изображение."""
+    try:
+        with Image.open(path) as image:
+            return needs_normalizing(image)
+    except OSError:
+        return None
+
+
+def normalize_or_skip(path):
+    """
+    Путь нормализованной копии, False, если нормализовать нечего,
+    и None вместо исключения для битых и пропавших файлов.
+    """
+    try:
+        return normalize_copy(path) or False
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нормализует уже загруженные изображения постов так же, как '
+        'PostForm при загрузке: поворот по EXIF, уменьшение до '
+        'POSTS_IMAGE_MAX_SIZE и перекодирование без метаданных. '
+        'Файлы обрабатываются в пуле процессов; новое содержимое '
+        'сохраняется под новым хешем, ссылки постов обновляются, '
+        'прежние файлы и их миниатюры удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=GC_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать файлы, которые нужно нормализовать.',
+        )
+        parser.add_argument(
+            '--skip-thumbnails',
+            action='store_true',
+            help='Не создавать миниатюры для новых имен.',
+        )
+
+    def replace(self, name, temp_path, options):
+        """Сохраняет копию по хешу и переводит на нее посты."""
+        try:
+            with open(temp_path, 'rb') as content:
+                target = image_storage.save(
+                    os.path.join(IMAGES_DIRECTORY, os.path.basename(name)),
+                    File(content),
+                )
+        finally:
+            os.remove(temp_path)
+        if target == name:
+            return
+        with transaction.atomic():
+            Post.objects.filter(image=name).update(
+                image=target, updated_at=timezone.now()
+            )
+            queue_image_deletion(name)
+        if not options['skip_thumbnails']:
+            submit_thumbnails(target)
+
+    def handle(self, *args, **options):
+        action = check_path if options['dry_run'] else normalize_or_skip
+        names = list(image_names(options['batch_size']))
+        total = changed = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            results = executor.map(
+                action,
+                [image_storage.path(name) for name in names],
+                chunksize=CHUNK_SIZE,
+            )
+            for name, result in zip(names, results):
+                total += 1
+                changed += bool(result)
+                failed += result is None
+                if result and not options['dry_run']:
+                    self.replace(name, result, options)
+        if options['dry_run']:
+            self.stdout.write(f'Требуют нормализации: {changed} из {total}')
+        else:
+            self.stdout.write(f'Нормализовано: {changed} из {total}')
+        if failed:
+            self.stdout.write(f'Не удалось прочитать: {failed}')
@@ -0,0 +1,56 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Comment, Post
+from posts.search import get_search_backend
+
+DEFAULT_CHUNK_SIZE: int = 1000
+
+
+def chunked(iterable, size):
+    """Разбивает итератор на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает поисковый индекс постов и комментариев. '
+        'Строки читаются из базы порциями, каждая порция '
+        'записывается отдельной транзакцией.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Количество строк в одной порции.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        backend = get_search_backend()
+        backend.clear()
+        sources = (
+            (Post, backend.index_posts),
+            (Comment, backend.index_comments),
+        )
+        for model, index in sources:
+            rows = model.objects.order_by('id').only('text').iterator(
+                chunk_size=chunk_size
+            )
+            total = 0
+            for chunk in chunked(rows, chunk_size):
+                with transaction.atomic():
+                    index(chunk)
+                total += len(chunk)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {total}'
+            )
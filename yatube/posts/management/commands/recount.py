@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import RECOUNT_BATCH_SIZE, recount_posts, recount_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики постов, комментариев и подписок с данными '
+        'и исправляет расхождения. Строки обрабатываются порциями, '
+        'каждая порция - отдельной транзакцией.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECOUNT_BATCH_SIZE,
+            help='Количество строк в одной порции.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество расхождений.',
+        )
+
+    def handle(self, *args, **options):
+        for name, recount in (
+            ('пользователи', recount_users),
+            ('посты', recount_posts),
+        ):
+            drift = recount(options['batch_size'], options['dry_run'])
+            self.stdout.write(f'{name}: расхождений {drift}')
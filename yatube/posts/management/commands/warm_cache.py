@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from posts.models import Group, UserStats
+
+
+def warm_urls(pages, groups, profiles):
+    """
+    Адреса для прогрева в порядке приоритета: первые pages страниц
+    главной, groups групп с наибольшим числом постов и profiles
+    профилей с наибольшим числом подписчиков (UserStats).
+    """
+    index = reverse('posts:index')
+    urls = [index] + [f'{index}?page={page}' for page in range(2, pages + 1)]
+    urls += [
+        reverse('posts:group_list', kwargs={'slug': slug})
+        for slug in Group.objects.annotate(
+            posts_total=Count('posts')
+        ).order_by('-posts_total').values_list('slug', flat=True)[:groups]
+    ]
+    urls += [
+        reverse('posts:profile', kwargs={'username': username})
+        for username in UserStats.objects.order_by(
+            '-followers_count', '-posts_count'
+        ).values_list('user__username', flat=True)[:profiles]
+    ]
+    return urls
+
+
+def render_page(url):
+    """
+    Рендерит страницу как анонимный GET-запрос, заполняя кеш страниц,
+    фрагментов и карточек. Возвращает код ответа.
+    """
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    match = resolve(request.path_info)
+    try:
+        return match.func(request, *match.args, **match.kwargs).status_code
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кеш после деплоя или очистки: рендерит первые страницы '
+        'главной, популярные группы и профили авторов с наибольшим '
+        'числом подписчиков в пуле потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=3)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--profiles', type=int, default=10)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Сколько страниц рендерится одновременно.',
+        )
+
+    def handle(self, *args, **options):
+        urls = warm_urls(
+            options['pages'], options['groups'], options['profiles']
+        )
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for url, status in zip(urls, executor.map(render_page, urls)):
+                if options['verbosity'] > 1 or status != 200:
+                    self.stdout.write(f'{status} {url}')
+        self.stdout.write(
+            f'Прогрето страниц: {len(urls)} '
+            f'за {perf_counter() - started:.2f} с'
+        )
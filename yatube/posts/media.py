@@ -0,0 +1,147 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+GC_BATCH_SIZE: int = 500
+GC_GRACE_PERIOD: int = 60 * 60
+IMAGES_DIRECTORY: str = Post._meta.get_field('image').upload_to.strip('/')
+image_storage = Post._meta.get_field('image').storage
+
+
+def grace_period():
+    """Сколько секунд после записи файл изображения нельзя удалять."""
+    return getattr(settings, 'POSTS_MEDIA_GRACE_PERIOD', GC_GRACE_PERIOD)
+
+
+def delete_images(names, grace=None):
+    """
+    Удаляет файлы изображений, на которые больше не ссылается ни один
+    пост, вместе с их миниатюрами и записями sorl-thumbnail. Файлы моложе
+    grace секунд не трогаются: тот же файл мог только что достаться
+    новому посту, транзакция которого еще не закончилась. Их удалит
+    gc_media, заново проверив ссылки, когда срок выйдет.
+    """
+    if grace is None:
+        grace = grace_period()
+    names = set(filter(None, names))
+    names -= set(Post.objects.filter(
+        image__in=names
+    ).values_list('image', flat=True))
+    deleted = 0
+    for name in names:
+        try:
+            if image_storage.exists(name) and not is_settled(
+                image_storage, name, grace
+            ):
+                continue
+            default.kvstore.delete(ImageFile(name, image_storage))
+            image_storage.delete(name)
+        except (OSError, SuspiciousFileOperation):
+            # Удаление идет после коммита и не должно ронять запрос.
+            logger.warning('Не удалось удалить %s', name, exc_info=True)
+        else:
+            deleted += 1
+    return deleted
+
+
+def image_names(batch_size=GC_BATCH_SIZE):
+    """Различные имена изображений постов, пачками по порядку имен."""
+    last = ''
+    while True:
+        names = list(Post.objects.filter(image__gt=last).order_by(
+            'image'
+        ).values_list('image', flat=True).distinct()[:batch_size])
+        if not names:
+            return
+        yield from names
+        last = names[-1]
+
+
+def queue_image_deletion(*names):
+    """Удаляет изображения после коммита текущей транзакции."""
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: delete_images(names))
+
+
+def stored_files(storage, directory):
+    """Имена файлов каталога хранилища (рекурсивно), по одному."""
+    directories, files = storage.listdir(directory)
+    for name in sorted(files):
+        yield os.path.join(directory, name)
+    for subdirectory in sorted(directories):
+        yield from stored_files(
+            storage, os.path.join(directory, subdirectory)
+        )
+
+
+def batches(names, batch_size):
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def is_settled(storage, name, grace_period):
+    """
+    Файл старше grace_period секунд: свежий файл может принадлежать
+    посту, транзакция которого еще не закончилась.
+    """
+    modified = storage.get_modified_time(name).timestamp()
+    return time.time() - modified > grace_period
+
+
+def orphaned_images(batch_size=GC_BATCH_SIZE, grace_period=GC_GRACE_PERIOD):
+    """Файлы изображений постов, на которые не ссылается ни один пост."""
+    if not image_storage.exists(IMAGES_DIRECTORY):
+        return
+    files = stored_files(image_storage, IMAGES_DIRECTORY)
+    for batch in batches(files, batch_size):
+        referenced = set(Post.objects.filter(
+            image__in=batch
+        ).values_list('image', flat=True))
+        for name in batch:
+            if name not in referenced and is_settled(
+                image_storage, name, grace_period
+            ):
+                yield name
+
+
+def orphaned_thumbnails(
+    batch_size=GC_BATCH_SIZE, grace_period=GC_GRACE_PERIOD
+):
+    """Файлы миниатюр, которых нет в kvstore sorl-thumbnail."""
+    directory = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+    if not default.storage.exists(directory):
+        return
+    files = stored_files(default.storage, directory)
+    for batch in batches(files, batch_size):
+        keys = {
+            add_prefix(ImageFile(name, default.storage).key): name
+            for name in batch
+        }
+        known = set(KVStoreModel.objects.filter(
+            key__in=keys
+        ).values_list('key', flat=True))
+        for key, name in keys.items():
+            if key not in known and is_settled(
+                default.storage, name, grace_period
+            ):
+                yield name
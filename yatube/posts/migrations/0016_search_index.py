@@ -0,0 +1,36 @@
+from django.db import migrations
+
+FTS_TABLES = ('posts_post_fts', 'posts_comment_fts')
+SOURCE_TABLES = ('posts_post', 'posts_comment')
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for fts_table, source_table in zip(FTS_TABLES, SOURCE_TABLES):
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5('
+            "text, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {fts_table} (rowid, text) '
+            f'SELECT id, text FROM {source_table}'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for fts_table in FTS_TABLES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_auto_20220716_2015'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+PATH_STEP = 10
+BATCH_SIZE = 500
+
+
+def fill_paths(apps, schema_editor):
+    """Существующие комментарии - корни своих веток."""
+    Comment = apps.get_model('posts', 'Comment')
+    comments = []
+    for comment in Comment.objects.only('id').iterator():
+        comment.path = f'{comment.id:0{PATH_STEP}d}/'
+        comments.append(comment)
+        if len(comments) == BATCH_SIZE:
+            Comment.objects.bulk_update(comments, ['path'])
+            comments = []
+    Comment.objects.bulk_update(comments, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_image_content_hash_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
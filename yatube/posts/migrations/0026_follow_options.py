@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_comment_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': 'подписка', 'verbose_name_plural': 'подписки'},
+        ),
+    ]
@@ -2,11 +2,19 @@ from django.db import models
 from django.contrib.auth import get_user_model
 
 from core.models import CreatedModel
+from .storage import ContentHashStorage
 
 
 User = get_user_model()
 
 SLICE_STOP: int = 15
+# Сегмент пути комментария - id с ведущими нулями и "/", поэтому
+# строковый порядок путей совпадает с порядком обхода дерева.
+PATH_STEP: int = 10
+PATH_MAX_LENGTH: int = 255
+COMMENT_MAX_DEPTH: int = PATH_MAX_LENGTH // (PATH_STEP + 1)
+# Символ больше цифр и "/": верхняя граница диапазона поддерева.
+PATH_END: str = ':'
 
 
 class Post(CreatedModel):
@@ -25,11 +33,30 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentHashStorage(),
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
         default_related_name = 'posts'
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
@@ -57,15 +84,63 @@ class Comment(CreatedModel):
         on_delete=models.CASCADE,
     )
     text = models.TextField()
+    parent = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='replies',
+        verbose_name='Ответ на',
+    )
+    path = models.CharField(
+        'Путь в ветке',
+        max_length=PATH_MAX_LENGTH,
+        default='',
+        editable=False,
+    )
 
     class Meta:
         default_related_name = 'comments'
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx',
+            ),
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:SLICE_STOP]
 
+    def save(self, *args, **kwargs):
+        """Путь известен только после вставки: он заканчивается id."""
+        super().save(*args, **kwargs)
+        if not self.path:
+            parent_path = self.parent.path if self.parent_id else ''
+            self.path = f'{parent_path}{self.pk:0{PATH_STEP}d}/'
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
+    @property
+    def depth(self):
+        """Уровень вложенности, у комментариев к посту - 0."""
+        return self.path.count('/') - 1
+
+    def subtree(self):
+        """
+        Комментарий со всеми ответами в порядке ветки: один диапазон
+        индекса (post, path) без рекурсии.
+        """
+        return Comment.objects.filter(
+            post_id=self.post_id,
+            path__gte=self.path,
+            path__lt=self.path + PATH_END,
+        ).order_by('path')
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -90,3 +165,65 @@ class Follow(models.Model):
                 name='unique_follower'
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок: пост автора, разложенный
+    в ленты его подписчиков при публикации.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post__id')
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """
+    Счетчики пользователя. Обновляются сигналами при изменении постов
+    и подписок, расхождения исправляет команда recount.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Количество постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Количество подписок', default=0
+    )
+
+    class Meta:
+        verbose_name = 'счетчики пользователя'
+        verbose_name_plural = 'счетчики пользователей'
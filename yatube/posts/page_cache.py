@@ -0,0 +1,130 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .generations import get_generations
+from .models import Comment, Post, User
+
+PAGE_CACHE_TIMEOUT: int = 60 * 5
+
+
+class PageState:
+    """
+    Состояние данных страницы: области поколений (см. generations)
+    и время последнего изменения постов и комментариев на ней.
+    """
+
+    def __init__(self, scopes, *modified):
+        self.scopes = scopes
+        dates = [date for date in modified if date is not None]
+        self.modified = max(dates) if dates else None
+
+    def etag(self, request):
+        generations = '.'.join(map(str, get_generations(*self.scopes)))
+        source = (
+            f'{request.get_full_path()}:{generations}:{self.modified}'
+        )
+        return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+
+def index_state(request):
+    modified = [Post.objects.aggregate(date=Max('updated_at'))['date']]
+    if request.GET.get('search'):
+        modified.append(
+            Comment.objects.aggregate(date=Max('pub_date'))['date']
+        )
+    return PageState([('index', None)], *modified)
+
+
+def group_state(request, slug):
+    modified = Post.objects.filter(group__slug=slug).aggregate(
+        date=Max('updated_at')
+    )['date']
+    return PageState([('group', slug)], modified)
+
+
+def profile_state(request, username):
+    user_id = User.objects.filter(
+        username=username
+    ).values_list('id', flat=True).first()
+    if user_id is None:
+        return None
+    modified = Post.objects.filter(author_id=user_id).aggregate(
+        date=Max('updated_at')
+    )['date']
+    return PageState([('author', user_id)], modified)
+
+
+def post_state(request, post_id):
+    post = Post.objects.filter(id=post_id).annotate(
+        last_comment=Max('comments__pub_date')
+    ).values('author_id', 'updated_at', 'last_comment').first()
+    if post is None:
+        return None
+    return PageState(
+        [('post', post_id), ('author', post['author_id'])],
+        post['updated_at'],
+        post['last_comment'],
+    )
+
+
+def cache_anonymous_page(get_state):
+    """
+    Кеширует страницу целиком для анонимных GET-запросов.
+    get_state(request, **kwargs) возвращает PageState страницы. Ключ
+    кеша и сильный ETag строятся по пути с GET-параметрами, поколениям
+    областей страницы и времени последнего изменения, поэтому записи
+    через представления и ORM сами делают прежние ключи неактуальными.
+    Повторный запрос с If-None-Match получает 304 без рендеринга.
+    Страница, в которой {% stale_cache %} отдал устаревший фрагмент,
+    не кешируется и не получает ETag. Last-Modified не отдается:
+    удаления, подписки и удаление пользователей меняют только
+    поколения, а не время изменения, и клиент с одним
+    If-Modified-Since получил бы устаревший 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated
+            ):
+                return view(request, *args, **kwargs)
+            state = get_state(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+            etag = state.etag(request)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                key = f'posts:page:{etag}'
+                cached = cache.get(key)
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                else:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    if getattr(request, 'stale_fragments', False):
+                        # Фрагмент отдан из прошлого поколения: ответ
+                        # не кешируется и не получает ETag нового.
+                        return response
+                    cache.set(
+                        key,
+                        (response.content, response['Content-Type']),
+                        getattr(
+                            settings,
+                            'POSTS_PAGE_CACHE_TIMEOUT',
+                            PAGE_CACHE_TIMEOUT,
+                        ),
+                    )
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
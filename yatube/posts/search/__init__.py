@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .backends import DatabaseSearchBackend
+from .query import SearchQuery  # noqa: F401
+
+DEFAULT_BACKEND: str = 'posts.search.backends.SQLiteFTSBackend'
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """
+    Возвращает поисковый бэкенд из settings.POSTS_SEARCH_BACKEND.
+    Если бэкенд не поддерживает текущую базу, используется поиск через ORM.
+    """
+    backend_path = getattr(settings, 'POSTS_SEARCH_BACKEND', DEFAULT_BACKEND)
+    backend = import_string(backend_path)()
+    if not backend.is_available():
+        return DatabaseSearchBackend()
+    return backend
+
+
+class RankedResults:
+    """
+    Результаты поиска, упорядоченные по релевантности.
+    Посты выбираются лениво: top(limit) отдает только limit лучших.
+    """
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.query = query
+
+    def top(self, limit):
+        return get_search_backend().ranked(self.queryset, self.query, limit)
@@ -0,0 +1,241 @@
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.expressions import RawSQL
+
+from ..models import Comment, Post
+from .ranking import bm25_top_k
+
+SYNC_CHUNK_SIZE: int = 500
+COMMENT_RANK_WEIGHT: float = 0.5
+POST_INDEX_TABLE: str = 'posts_post_fts'
+COMMENT_INDEX_TABLE: str = 'posts_comment_fts'
+
+
+class RawSubquery(RawSQL):
+    """
+    Подзапрос для lookup __in. В отличие от RawSQL не оборачивается
+    в скобки: иначе SQLite получит IN ((...)) и возьмет только первую
+    строку скалярного подзапроса.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class BaseSearchBackend:
+    """
+    Базовый поисковый бэкенд.
+    Определяет интерфейс, который используют представления и сигналы.
+    """
+
+    def is_available(self):
+        """Может ли бэкенд работать с текущей базой данных."""
+        return True
+
+    def filter(self, queryset, query):
+        """
+        Оставляет в queryset только посты, подходящие под текстовую часть
+        запроса query (SearchQuery).
+        """
+        raise NotImplementedError
+
+    def ranked(self, queryset, query, limit):
+        """
+        Возвращает список из не более чем limit постов queryset,
+        упорядоченный по убыванию релевантности (BM25).
+        """
+        raise NotImplementedError
+
+    def index_posts(self, posts):
+        """Добавляет или обновляет посты в индексе."""
+
+    def delete_posts(self, post_ids):
+        """Удаляет посты из индекса."""
+
+    def index_comments(self, comments):
+        """Добавляет или обновляет комментарии в индексе."""
+
+    def delete_comments(self, comment_ids):
+        """Удаляет комментарии из индекса."""
+
+    def clear(self):
+        """Полностью очищает индекс."""
+
+    def sync_posts(self, post_ids):
+        """
+        Приводит записи индекса к текущему состоянию постов в базе:
+        существующие посты переиндексируются, удаленные убираются.
+        """
+        self._sync(Post, post_ids, self.index_posts, self.delete_posts)
+
+    def sync_comments(self, comment_ids):
+        """То же, что sync_posts, для комментариев."""
+        self._sync(
+            Comment, comment_ids, self.index_comments, self.delete_comments
+        )
+
+    @staticmethod
+    def _sync(model, ids, index, delete):
+        ids = list(ids)
+        for start in range(0, len(ids), SYNC_CHUNK_SIZE):
+            chunk = ids[start:start + SYNC_CHUNK_SIZE]
+            objects = list(model.objects.filter(id__in=chunk).only('text'))
+            index(objects)
+            delete(set(chunk) - {obj.id for obj in objects})
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Поиск средствами ORM (LIKE '%...%').
+    Запасной вариант для баз без полнотекстового индекса.
+    Комментарии проверяются коррелированным EXISTS, а не JOIN: пост
+    с несколькими подходящими комментариями возвращается один раз,
+    а LIKE проверяет только комментарии постов, прошедших остальные
+    условия, поиском по индексу post_id.
+    """
+
+    def filter(self, queryset, query):
+        needles = query.terms + [' '.join(words) for words in query.phrases]
+        for number, needle in enumerate(needles):
+            name = f'comment_match_{number}'
+            queryset = queryset.annotate(**{name: Exists(
+                Comment.objects.filter(
+                    post=OuterRef('pk'), text__icontains=needle
+                )
+            )}).filter(Q(text__icontains=needle) | Q(**{name: True}))
+        return queryset
+
+    def ranked(self, queryset, query, limit):
+        terms = set(query.words)
+        candidates = self.filter(queryset, query).values_list('id', 'text')
+        ids = bm25_top_k(
+            candidates.iterator(),
+            terms,
+            queryset.model.objects.count(),
+            limit,
+        )
+        posts = queryset.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск на виртуальных таблицах SQLite FTS5.
+    rowid записи индекса совпадает с id поста или комментария.
+    """
+
+    def is_available(self):
+        return connection.vendor == 'sqlite'
+
+    @staticmethod
+    def build_match(query):
+        """
+        Превращает текстовую часть запроса в выражение MATCH.
+        Слова ищутся по префиксу, фразы - целиком, все части
+        объединяются через AND. Слова состоят только из букв и цифр,
+        поэтому кавычки и операторы FTS5 в них попасть не могут.
+        """
+        parts = [f'"{term}"*' for term in query.terms]
+        parts += [f'"{" ".join(words)}"' for words in query.phrases]
+        return ' '.join(parts)
+
+    def filter(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(id__in=RawSubquery(
+            f'SELECT rowid FROM {POST_INDEX_TABLE} '
+            f'WHERE {POST_INDEX_TABLE} MATCH %s '
+            f'UNION SELECT c.post_id FROM {COMMENT_INDEX_TABLE} '
+            f'INNER JOIN posts_comment c '
+            f'ON c.id = {COMMENT_INDEX_TABLE}.rowid '
+            f'WHERE {COMMENT_INDEX_TABLE} MATCH %s',
+            (match, match),
+        ))
+
+    def ranked(self, queryset, query, limit):
+        """
+        Оценка поста - BM25 его текста плюс взвешенная оценка лучшего
+        комментария. Каждый MATCH выполняется один раз: производные
+        таблицы (rowid, bm25) постов и MIN(bm25) комментариев по постам
+        присоединяются к постам queryset, а сортировка с LIMIT в SQLite
+        держит в памяти только limit лучших строк.
+        """
+        match = self.build_match(query)
+        if not match:
+            return []
+        candidates, params = queryset.order_by().values(
+            'id', 'pub_date'
+        ).query.sql_with_params()
+        sql = (
+            f'WITH post_match AS MATERIALIZED ('
+            f'SELECT rowid AS post_id, bm25({POST_INDEX_TABLE}) AS score '
+            f'FROM {POST_INDEX_TABLE} WHERE {POST_INDEX_TABLE} MATCH %s), '
+            f'comment_match AS MATERIALIZED ('
+            f'SELECT rowid AS comment_id, '
+            f'bm25({COMMENT_INDEX_TABLE}) AS score '
+            f'FROM {COMMENT_INDEX_TABLE} '
+            f'WHERE {COMMENT_INDEX_TABLE} MATCH %s), '
+            f'scores AS ('
+            f'SELECT post_id, SUM(score) AS score FROM ('
+            f'SELECT post_id, score FROM post_match UNION ALL '
+            f'SELECT c.post_id, %s * MIN(comment_match.score) '
+            f'FROM comment_match INNER JOIN posts_comment c '
+            f'ON c.id = comment_match.comment_id GROUP BY c.post_id) '
+            f'GROUP BY post_id) '
+            f'SELECT candidate.id FROM scores '
+            f'INNER JOIN ({candidates}) candidate '
+            f'ON candidate.id = scores.post_id '
+            f'ORDER BY scores.score, candidate.pub_date DESC, '
+            f'candidate.id DESC LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql, (match, match, COMMENT_RANK_WEIGHT, *params, limit)
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = queryset.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+    @staticmethod
+    def _replace(table, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {table} WHERE rowid = %s',
+                [(row_id,) for row_id, _ in rows],
+            )
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, text) VALUES (%s, %s)',
+                rows,
+            )
+
+    @staticmethod
+    def _delete(table, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {table} WHERE rowid = %s',
+                [(row_id,) for row_id in ids],
+            )
+
+    def index_posts(self, posts):
+        self._replace(POST_INDEX_TABLE, ((p.id, p.text) for p in posts))
+
+    def delete_posts(self, post_ids):
+        self._delete(POST_INDEX_TABLE, post_ids)
+
+    def index_comments(self, comments):
+        self._replace(COMMENT_INDEX_TABLE, ((c.id, c.text) for c in comments))
+
+    def delete_comments(self, comment_ids):
+        self._delete(COMMENT_INDEX_TABLE, comment_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            for table in (POST_INDEX_TABLE, COMMENT_INDEX_TABLE):
+                cursor.execute(f'DELETE FROM {table}')
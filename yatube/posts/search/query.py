@@ -0,0 +1,99 @@
+import re
+from datetime import datetime, time
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .ranking import tokenize
+
+TOKEN_PATTERN = re.compile(
+    r'(?P<key>\w+):(?:"(?P<quoted>[^"]*)"|(?P<value>\S+))'
+    r'|"(?P<phrase>[^"]*)"?'
+    r'|(?P<word>\S+)'
+)
+DATE_FORMAT: str = '%Y-%m-%d'
+
+
+def start_of_day(value):
+    """Разбирает дату ГГГГ-ММ-ДД в начало суток текущей таймзоны."""
+    day = datetime.strptime(value, DATE_FORMAT).date()
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class SearchQuery:
+    """
+    Разобранный поисковый запрос вида
+    author:leo group:cats after:2022-06-01 before:2022-07-01 "фраза" слова.
+
+    author и group сравниваются на равенство (ключ можно повторить),
+    after и before задают полуинтервал [after, before) по pub_date,
+    а слова и фразы в кавычках ищутся полнотекстовым бэкендом.
+    """
+
+    def __init__(self, terms=(), phrases=(), authors=(), groups=(),
+                 after=None, before=None):
+        self.terms = list(terms)
+        self.phrases = list(phrases)
+        self.authors = list(authors)
+        self.groups = list(groups)
+        self.after = after
+        self.before = before
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Разбирает строку запроса. Неизвестные ключи считаются обычным
+        текстом, фильтры с неверной датой отбрасываются.
+        """
+        query = cls()
+        for match in TOKEN_PATTERN.finditer(text):
+            key = (match.group('key') or '').lower()
+            value = match.group('quoted') or match.group('value')
+            if key == 'author':
+                query.authors.append(value)
+            elif key == 'group':
+                query.groups.append(value)
+            elif key in ('after', 'before'):
+                try:
+                    setattr(query, key, start_of_day(value))
+                except ValueError:
+                    pass
+            elif match.group('phrase') is not None:
+                words = tokenize(match.group('phrase'))
+                if len(words) > 1:
+                    query.phrases.append(words)
+                else:
+                    query.terms.extend(words)
+            else:
+                query.terms.extend(tokenize(match.group(0)))
+        return query
+
+    @property
+    def has_text(self):
+        """Есть ли в запросе полнотекстовая часть."""
+        return bool(self.terms or self.phrases)
+
+    @property
+    def words(self):
+        """Все слова запроса, включая слова фраз."""
+        return self.terms + [word for words in self.phrases for word in words]
+
+    def filters(self):
+        """
+        Условия по индексируемым колонкам: username и slug уникальны,
+        pub_date проиндексирован, поэтому каждое условие - поиск по индексу.
+        """
+        condition = Q()
+        if self.authors:
+            condition &= Q(author__username__in=self.authors)
+        if self.groups:
+            condition &= Q(group__slug__in=self.groups)
+        if self.after:
+            condition &= Q(pub_date__gte=self.after)
+        if self.before:
+            condition &= Q(pub_date__lt=self.before)
+        return condition
+
+    def apply(self, queryset):
+        """Накладывает на queryset условия по колонкам."""
+        return queryset.filter(self.filters())
@@ -0,0 +1,57 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+TERM_PATTERN = re.compile(r'\w+')
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+
+
+def tokenize(text):
+    """Разбивает текст на слова в нижнем регистре."""
+    return TERM_PATTERN.findall(text.lower())
+
+
+def bm25_top_k(documents, terms, total_docs, k):
+    """
+    Возвращает id k самых релевантных документов по BM25.
+    documents - итератор пар (id, текст); слово запроса совпадает со
+    словом документа по префиксу, как и в FTS5. Средняя длина документа
+    считается по переданным кандидатам, а отбор идет через кучу размера k.
+    """
+    terms = tuple(terms)
+    stats = []
+    document_frequency = Counter()
+    total_length = 0
+    for doc_id, text in documents:
+        tokens = tokenize(text)
+        frequency = Counter(
+            term for token in tokens for term in terms
+            if token.startswith(term)
+        )
+        document_frequency.update(frequency.keys())
+        total_length += len(tokens)
+        stats.append((doc_id, len(tokens), frequency))
+    if not stats:
+        return []
+    average_length = total_length / len(stats) or 1
+    idf = {
+        term: math.log(
+            (total_docs - df + 0.5) / (df + 0.5) + 1
+        )
+        for term, df in document_frequency.items()
+    }
+
+    def score(length, frequency):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+        return sum(
+            idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            for term, tf in frequency.items()
+        )
+
+    best = heapq.nlargest(
+        k,
+        ((score(length, freq), doc_id) for doc_id, length, freq in stats),
+    )
+    return [doc_id for _, doc_id in best]
@@ -0,0 +1,45 @@
+import threading
+
+from django.db import transaction
+
+_local = threading.local()
+
+
+class PendingUpdate:
+    """
+    Идентификаторы постов и комментариев, измененных в текущей транзакции.
+    Индекс обновляется один раз после коммита, одной транзакцией.
+    """
+
+    def __init__(self):
+        self.post_ids = set()
+        self.comment_ids = set()
+
+    def flush(self):
+        from . import get_search_backend
+
+        if getattr(_local, 'pending', None) is self:
+            del _local.pending
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.sync_posts(self.post_ids)
+            backend.sync_comments(self.comment_ids)
+
+
+def schedule_update(post_ids=(), comment_ids=()):
+    """
+    Помечает посты и комментарии для переиндексации после коммита.
+    Вне транзакции индекс обновляется сразу. Пакет отмененной транзакции
+    пропадает из run_on_commit, поэтому для следующей создается новый.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(_local, 'pending', None)
+    scheduled = pending is not None and any(
+        func == pending.flush for _, func in connection.run_on_commit
+    )
+    if not scheduled:
+        pending = _local.pending = PendingUpdate()
+    pending.post_ids.update(post_ids)
+    pending.comment_ids.update(comment_ids)
+    if not scheduled:
+        transaction.on_commit(pending.flush)
@@ -0,0 +1,184 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import adjust_post, adjust_user
+from .counts import invalidate_counts
+from .media import queue_image_deletion
+from .models import Comment, Follow, Post, User, UserStats
+from .search.updates import schedule_update
+from .timeline import backfill, fan_out, fan_out_limit, push_author, remove
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def update_post_search_index(sender, instance, **kwargs):
+    """Переиндексирует пост после сохранения или удаления."""
+    schedule_update(post_ids=[instance.id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_comment_search_index(sender, instance, **kwargs):
+    """Переиндексирует комментарий после сохранения или удаления."""
+    schedule_update(comment_ids=[instance.id])
+
+
+def post_count_keys(post):
+    """Списки, в которые входит пост: лента, группа, автор, подписчики."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    return [
+        ('index', None),
+        ('group', post.group_id),
+        ('author', post.author_id),
+        *(('follow', user_id) for user_id in followers),
+    ]
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, **kwargs):
+    """
+    Запоминает прежние группу поста, чтобы сбросить и ее счетчик,
+    и изображение, чтобы удалить его файл при замене.
+    """
+    instance._previous_group_id = instance._previous_image = None
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_counts_on_save(sender, instance, created, **kwargs):
+    """Сбрасывает количества постов, если пост добавлен или сменил группу."""
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if created:
+        invalidate_counts(*post_count_keys(instance))
+    elif previous_group_id != instance.group_id:
+        invalidate_counts(
+            ('group', previous_group_id), ('group', instance.group_id)
+        )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_post_counts_on_delete(sender, instance, **kwargs):
+    """Сбрасывает количества постов после удаления поста."""
+    invalidate_counts(*post_count_keys(instance))
+
+
+@receiver(post_save, sender=Post)
+def delete_replaced_image(sender, instance, created, **kwargs):
+    """Файл замененного изображения удаляется после коммита."""
+    previous_image = getattr(instance, '_previous_image', None)
+    if previous_image and previous_image != instance.image.name:
+        queue_image_deletion(previous_image)
+
+
+@receiver(post_delete, sender=Post)
+def delete_post_image(sender, instance, **kwargs):
+    """
+    Файл изображения удаленного поста, в том числе при каскадном
+    удалении автора, удаляется после коммита.
+    """
+    queue_image_deletion(instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_count(sender, instance, **kwargs):
+    """Сбрасывает количество постов в ленте подписок пользователя."""
+    invalidate_counts(('follow', instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """Создает счетчики нового пользователя."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def increment_posts_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик постов автора."""
+    if created:
+        adjust_user(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_posts_count(sender, instance, **kwargs):
+    """Уменьшает счетчик постов автора."""
+    adjust_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comments_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик комментариев поста."""
+    if created:
+        adjust_post(instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comments_count(sender, instance, **kwargs):
+    """Уменьшает счетчик комментариев поста."""
+    adjust_post(instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_commented_post(sender, instance, **kwargs):
+    """
+    Обновляет updated_at поста: карточка показывает последние
+    комментарии, и ее ключ должен меняться с каждым из них, даже если
+    их количество осталось прежним.
+    """
+    Post.objects.filter(id=instance.post_id).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counts(sender, instance, created, **kwargs):
+    """Увеличивает счетчики подписчиков автора и подписок читателя."""
+    if created:
+        adjust_user(instance.author_id, 'followers_count', 1)
+        adjust_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counts(sender, instance, **kwargs):
+    """Уменьшает счетчики подписчиков автора и подписок читателя."""
+    adjust_user(instance.author_id, 'followers_count', -1)
+    adjust_user(instance.user_id, 'following_count', -1)
+
+
+# Ленты читают followers_count, поэтому подключаются после счетчиков.
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    if created:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Заполняет ленту читателя постами автора, на которого он подписался."""
+    if created:
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_from_timeline(sender, instance, **kwargs):
+    """
+    Убирает посты автора из ленты отписавшегося читателя. Если после
+    отписки автор опустился до порога fan-out, его посты раскладываются
+    в ленты оставшихся подписчиков.
+    """
+    remove(instance.user_id, instance.author_id)
+    if UserStats.objects.filter(
+        user_id=instance.author_id, followers_count=fan_out_limit()
+    ).exists():
+        push_author(instance.author_id)
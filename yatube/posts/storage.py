@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def file_digest(content):
+    """SHA-256 содержимого файла, читается по частям."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла - хеш его содержимого:
+    upload_to/ab/abcdef....jpg. Одинаковые файлы хранятся один раз,
+    и на один файл ссылаются несколько постов; миниатюры sorl-thumbnail
+    привязаны к имени и тоже создаются один раз. Файл удаляется, когда
+    на него не ссылается ни один пост (см. media.delete_images).
+    """
+
+    def hashed_name(self, name, content):
+        digest = file_digest(content)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от удаления (см.
+            # media.delete_images), пока новый пост не закоммичен.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
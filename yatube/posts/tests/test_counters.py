@@ -0,0 +1,69 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    """Тестируем денормализованные счетчики."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_signals_update_counters(self):
+        """Счетчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            text='Комментарий', author=self.reader, post=post
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_recount_fixes_drift(self):
+        """recount находит и исправляет расхождения порциями."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.author) for i in range(3)
+        )
+        UserStats.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('recount', dry_run=True, stdout=out)
+        self.assertIn('пользователи: расхождений 2', out.getvalue())
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        call_command('recount', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('пользователи: расхождений 0', out.getvalue())
+
+    def test_post_detail_uses_counters(self):
+        """Страница поста берет количества из счетчиков."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertEqual(response.context['author_stats'].posts_count, 1)
@@ -0,0 +1,123 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+from ..storage import file_digest
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+MAX_SIZE: int = 100
+EXIF_ORIENTATION: int = 0x0112
+ROTATED_90: int = 6
+
+
+def make_jpeg(size, orientation=None):
+    """JPEG заданного размера, при orientation - с тегом EXIF."""
+    options = {}
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        options['exif'] = exif.tobytes()
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='JPEG', **options)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_IMAGE_MAX_SIZE=MAX_SIZE)
+class ImageNormalizationTests(TestCase):
+    """Тестируем нормализацию загружаемых изображений."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ImageNormalizationTests.user)
+
+    def test_upload_normalized(self):
+        """Загрузка уменьшается, поворачивается по EXIF и теряет EXIF."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с фотографией',
+                'image': SimpleUploadedFile(
+                    'photo.jpg',
+                    make_jpeg((400, 200), ROTATED_90),
+                    content_type='image/jpeg',
+                ),
+            },
+        )
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (MAX_SIZE // 2, MAX_SIZE))
+            self.assertFalse(image.getexif())
+
+    def test_truncated_upload_rejected(self):
+        """Обрезанный файл дает ошибку формы, а не 500."""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с битой фотографией',
+                'image': SimpleUploadedFile(
+                    'broken.jpg',
+                    make_jpeg((400, 200), ROTATED_90)[:-100],
+                    content_type='image/jpeg',
+                ),
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.exists())
+
+    def test_normalize_media(self):
+        """
+        Команда нормализует только нужные файлы, сохраняет их под новым
+        хешем и переводит на него посты.
+        """
+        posts = {
+            size: Post.objects.create(
+                text='Тестовый пост',
+                author=self.user,
+                image=default_storage.save(
+                    'posts/legacy.jpg', ContentFile(make_jpeg(size))
+                ),
+            )
+            for size in ((300, 150), (50, 50))
+        }
+        names = {size: post.image.name for size, post in posts.items()}
+        out = StringIO()
+        call_command('normalize_media', dry_run=True, workers=1, stdout=out)
+        self.assertIn('Требуют нормализации: 1 из 2', out.getvalue())
+        call_command(
+            'normalize_media', workers=1, skip_thumbnails=True, stdout=out
+        )
+        self.assertIn('Нормализовано: 1 из 2', out.getvalue())
+        large, small = (
+            Post.objects.get(id=posts[size].id) for size in names
+        )
+        self.assertEqual(small.image.name, names[(50, 50)])
+        self.assertNotEqual(large.image.name, names[(300, 150)])
+        with large.image.open() as content:
+            self.assertIn(file_digest(content), large.image.name)
+        with Image.open(large.image.path) as image:
+            self.assertEqual(image.size, (MAX_SIZE, MAX_SIZE // 2))
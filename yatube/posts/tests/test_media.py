@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+
+from ..media import GC_GRACE_PERIOD
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def make_gif(color):
+    """Другой GIF 1x1 заданного цвета."""
+    buffer = BytesIO()
+    Image.new('RGB', (1, 1), color).save(buffer, format='GIF')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_MEDIA_GRACE_PERIOD=0)
+class MediaGarbageCollectionTests(TransactionTestCase):
+    """Тестируем удаление лишних медиафайлов."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Файлы прошлых тестов остались, а их посты уже удалены.
+        for directory in ('posts', 'cache'):
+            shutil.rmtree(
+                os.path.join(TEMP_MEDIA_ROOT, directory), ignore_errors=True
+            )
+        self.user = User.objects.create_user(username='auth')
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        post = Post(text='Тестовый пост', author=self.user)
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_deleted_post_image_removed(self):
+        """Изображения удаленного поста и автора удаляются с диска."""
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        self.assertFalse(default_storage.exists(name))
+        name = self.create_post().image.name
+        self.user.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_image_removed(self):
+        """Замененное изображение удаляется, новое остается."""
+        post = self.create_post()
+        old_name = post.image.name
+        post.image.save('new.gif', ContentFile(make_gif('red')))
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    @override_settings(POSTS_MEDIA_GRACE_PERIOD=GC_GRACE_PERIOD)
+    def test_fresh_image_left_to_gc(self):
+        """
+        Свежий файл не удаляется сразу: его мог получить еще не
+        закоммиченный пост. gc_media удаляет его, заново проверив ссылки.
+        """
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        self.assertTrue(default_storage.exists(name))
+        call_command('gc_media', grace=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_reused_file_touched(self):
+        """Повторная загрузка того же файла обновляет время изменения."""
+        name = self.create_post().image.name
+        path = default_storage.path(name)
+        os.utime(path, (0, 0))
+        self.assertEqual(self.create_post().image.name, name)
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_gc_media(self):
+        """Команда удаляет только файлы без ссылок из базы."""
+        kept = self.create_post().image.name
+        orphan = default_storage.save('posts/orphan.gif', ContentFile(b'x'))
+        thumbnail = default_storage.save(
+            os.path.join('cache', 'ab', 'cd', 'thumb.jpg'), ContentFile(b'x')
+        )
+        out = StringIO()
+        call_command('gc_media', grace=0, dry_run=True, stdout=out)
+        self.assertIn('Лишних изображений: 1, миниатюр: 1', out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+        call_command('gc_media', grace=0, stdout=out)
+        self.assertIn('Удалено изображений: 1, миниатюр: 1', out.getvalue())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(thumbnail))
+        self.assertTrue(default_storage.exists(kept))
+        fresh = default_storage.save('posts/fresh.gif', ContentFile(b'x'))
+        call_command('gc_media', stdout=out)
+        self.assertIn('Удалено изображений: 0, миниатюр: 0', out.getvalue())
+        self.assertTrue(default_storage.exists(fresh))
+
+    def test_identical_uploads_stored_once(self):
+        """Одинаковые файлы хранятся один раз, пока на них есть ссылки."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        first.delete()
+        self.assertTrue(default_storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(default_storage.exists(second.image.name))
+
+    def test_dedupe_media(self):
+        """Команда переносит файлы по хешу и сливает дубликаты."""
+        legacy = {}
+        for name, content in (
+            ('a.gif', SMALL_GIF), ('b.gif', SMALL_GIF), ('c.gif', make_gif(1))
+        ):
+            legacy[name] = default_storage.save(
+                f'posts/{name}', ContentFile(content)
+            )
+            Post.objects.create(
+                text='Тестовый пост', author=self.user, image=legacy[name]
+            )
+        out = StringIO()
+        call_command('dedupe_media', dry_run=True, stdout=out)
+        self.assertIn('перенесено 2, слито дубликатов 1', out.getvalue())
+        self.assertTrue(default_storage.exists(legacy['a.gif']))
+        call_command('dedupe_media', skip_thumbnails=True, stdout=out)
+        self.assertIn('перенесено 2, слито дубликатов 1', out.getvalue())
+        names = list(
+            Post.objects.order_by('id').values_list('image', flat=True)
+        )
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[0], names[2])
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+        for name in legacy.values():
+            self.assertFalse(default_storage.exists(name))
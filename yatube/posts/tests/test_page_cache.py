@@ -0,0 +1,118 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from ..models import Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+    """Тестируем кеш страниц для анонимных пользователей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(AnonymousPageCacheTests.user)
+
+    def test_repeat_request_served_from_cache(self):
+        """Повторный анонимный запрос не рендерит страницу."""
+        url = reverse('posts:index')
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertIsNotNone(first.context)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertNotIn('Last-Modified', second)
+
+    def test_conditional_get(self):
+        """Запрос с совпадающим ETag получает 304."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_if_modified_since_ignored(self):
+        """
+        Без Last-Modified запрос только с If-Modified-Since рендерится:
+        подписка меняет страницу профиля, но не время изменения постов.
+        """
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.client.get(url)
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'auth'})
+        )
+        self.client.logout()
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Подписчиков: 1')
+
+    def test_writes_change_etag(self):
+        """Комментарий и подписка меняют ETag затронутых страниц."""
+        post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+        profile_url = reverse('posts:profile', kwargs={'username': 'auth'})
+        post_etag = self.client.get(post_url)['ETag']
+        profile_etag = self.client.get(profile_url)['ETag']
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Комментарий'},
+        )
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'auth'})
+        )
+        self.client.logout()
+        response = self.client.get(post_url, HTTP_IF_NONE_MATCH=post_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+        self.assertNotEqual(self.client.get(profile_url)['ETag'], profile_etag)
+
+    def test_stale_fragment_not_cached(self):
+        """
+        Страница, в которой фрагмент отдан из прошлого поколения, пока
+        его пересчитывает другой запрос, не кешируется и не получает ETag.
+        """
+        url = reverse('posts:index')
+        post = Post.objects.create(text='Удаляемый пост', author=self.user)
+        self.client.get(url)
+        lock_key = make_template_fragment_key('index_page', ['', ''])
+        cache.add(f'{lock_key}:lock', True)
+        self.authorized_client.get(
+            reverse('posts:post_delete', kwargs={'post_id': post.id})
+        )
+        response = self.client.get(url)
+        self.assertContains(response, 'Удаляемый пост')
+        self.assertNotIn('ETag', response)
+        cache.delete(f'{lock_key}:lock')
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertNotContains(response, 'Удаляемый пост')
+        self.assertIn('ETag', response)
+
+    def test_authorized_not_cached(self):
+        """Страницы авторизованных пользователей не кешируются."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertNotIn('ETag', response)
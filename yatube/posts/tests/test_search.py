@@ -0,0 +1,298 @@
+from datetime import date, datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    Client, SimpleTestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Group, Post
+from ..search import SearchQuery, get_search_backend
+from ..search.backends import (
+    POST_INDEX_TABLE, DatabaseSearchBackend, SQLiteFTSBackend
+)
+from ..search.ranking import bm25_top_k
+from ..utils import PAGE_NOTES_LIMIT
+
+User = get_user_model()
+
+
+class PostSearchTests(TransactionTestCase):
+    """Тестируем полнотекстовый поиск приложения Posts."""
+
+    def setUp(self):
+        get_search_backend().clear()
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.cat_post = Post.objects.create(
+            text='Котики спасут мир',
+            author=self.user,
+            group=self.group,
+        )
+        self.dog_post = Post.objects.create(
+            text='Собаки тоже ничего',
+            author=self.user,
+        )
+        self.comment = Comment.objects.create(
+            post=self.dog_post,
+            author=self.user,
+            text='Лучше кошки',
+        )
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def search(self, query):
+        response = self.guest_client.get(
+            reverse('posts:index'), {'search': query}
+        )
+        return list(response.context['page_obj'])
+
+    def index_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {POST_INDEX_TABLE}')
+            return cursor.fetchone()[0]
+
+    def test_default_backend(self):
+        """Проверяем, что по умолчанию используется FTS5."""
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+
+    def test_search_post_text(self):
+        """Проверяем поиск по тексту поста без учета регистра."""
+        self.assertEqual(self.search('КОТИКИ'), [self.cat_post])
+
+    def test_search_prefix(self):
+        """Проверяем поиск по началу слова."""
+        self.assertEqual(self.search('соба'), [self.dog_post])
+
+    def test_search_comment_text(self):
+        """Проверяем, что пост находится по тексту комментария."""
+        self.assertEqual(self.search('кошки'), [self.dog_post])
+
+    def test_search_several_matches(self):
+        """
+        Проверяем, что находятся все подходящие посты, а не только первая
+        строка подзапроса: и по тексту, и по комментариям.
+        """
+        posts = [
+            Post.objects.create(text=f'Рыжий хомяк {i}', author=self.user)
+            for i in range(3)
+        ]
+        Comment.objects.create(
+            post=self.cat_post, author=self.user, text='И хомяки тоже'
+        )
+        for backend in (SQLiteFTSBackend(), DatabaseSearchBackend()):
+            with self.subTest(backend=backend):
+                found = backend.filter(
+                    Post.objects.all(), SearchQuery.parse('хомяк')
+                )
+                self.assertCountEqual(found, [*posts, self.cat_post])
+                self.assertEqual(found.count(), len(posts) + 1)
+
+    def test_search_special_characters(self):
+        """Проверяем, что синтаксис FTS5 в запросе не ломает поиск."""
+        self.assertEqual(self.search('"котики*) ('), [self.cat_post])
+        self.assertEqual(self.search('***'), [self.dog_post, self.cat_post])
+
+    def test_index_follows_edit(self):
+        """Проверяем, что индекс обновляется при редактировании поста."""
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.cat_post.id}),
+            data={'text': 'Хомяки', 'group': self.group.id},
+        )
+        self.assertEqual(self.search('котики'), [])
+        self.assertEqual(self.search('хомяки'), [self.cat_post])
+
+    def test_index_follows_new_comment(self):
+        """Проверяем, что новый комментарий сразу попадает в индекс."""
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.cat_post.id}),
+            data={'text': 'Попугаи'},
+        )
+        self.assertEqual(self.search('попугаи'), [self.cat_post])
+
+    def test_index_follows_user_delete(self):
+        """Проверяем, что каскадное удаление чистит индекс."""
+        self.authorized_client.get(
+            reverse('posts:user_delete', kwargs={'username': 'auth'})
+        )
+        self.assertEqual(self.index_size(), 0)
+
+    def test_index_updated_after_commit(self):
+        """Проверяем, что внутри транзакции индекс обновляется при коммите."""
+        with transaction.atomic():
+            post = Post.objects.create(text='Ежики', author=self.user)
+            post.text = 'Ежики в тумане'
+            post.save()
+            self.assertEqual(self.index_size(), 2)
+        self.assertEqual(self.index_size(), 3)
+        self.assertEqual(self.search('тумане'), [post])
+
+    def test_rolled_back_update_dropped(self):
+        """Проверяем, что отмененная транзакция не попадает в индекс."""
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Post.objects.create(text='Ежики', author=self.user)
+            raise RuntimeError
+        Post.objects.create(text='Ужи', author=self.user)
+        self.assertEqual(self.search('ежики'), [])
+        self.assertEqual(self.index_size(), 3)
+
+    def test_rebuild_search_index(self):
+        """Проверяем, что rebuild_search_index восстанавливает индекс."""
+        get_search_backend().clear()
+        call_command('rebuild_search_index', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.index_size(), 2)
+        self.assertEqual(self.search('кошки'), [self.dog_post])
+
+    def test_search_ranked_by_relevance(self):
+        """Проверяем, что результаты поиска отсортированы по BM25."""
+        best = Post.objects.create(
+            text='Котики котики котики', author=self.user
+        )
+        self.assertEqual(self.search('котики'), [best, self.cat_post])
+        response = self.guest_client.get(
+            reverse('posts:index'), {'search': 'котики', 'order': 'date'}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), [best, self.cat_post]
+        )
+
+    def test_database_backend_ranked(self):
+        """Проверяем ранжирование запасного ORM-бэкенда."""
+        best = Post.objects.create(
+            text='котики котики котики', author=self.user
+        )
+        self.assertEqual(
+            DatabaseSearchBackend().ranked(
+                Post.objects.all(), SearchQuery.parse('котики'), 1
+            ),
+            [best],
+        )
+
+    def test_search_structured_filters(self):
+        """Проверяем фильтры author:, group:, after: и before:."""
+        other = User.objects.create_user(username='other')
+        other_post = Post.objects.create(text='Котики тоже', author=other)
+        Post.objects.filter(id=self.dog_post.id).update(
+            pub_date=datetime(2022, 6, 1, 12, tzinfo=timezone.utc)
+        )
+        self.assertEqual(self.search('author:other'), [other_post])
+        self.assertEqual(self.search('author:other котики'), [other_post])
+        self.assertEqual(self.search('group:test-slug'), [self.cat_post])
+        self.assertEqual(self.search('before:2022-06-02'), [self.dog_post])
+        self.assertEqual(self.search('after:2022-06-02 author:auth'), [
+            self.cat_post
+        ])
+        self.assertEqual(self.search('author:nobody'), [])
+
+    def test_search_no_duplicates(self):
+        """
+        Проверяем, что пост с несколькими подходящими комментариями
+        попадает в выдачу и в подсчет паджинатора один раз.
+        """
+        Comment.objects.bulk_create(
+            Comment(post=self.cat_post, author=self.user, text='мышки')
+            for _ in range(3)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        for backend in (SQLiteFTSBackend(), DatabaseSearchBackend()):
+            with self.subTest(backend=backend):
+                posts = backend.filter(
+                    Post.objects.all(), SearchQuery.parse('мышки')
+                )
+                self.assertEqual(list(posts), [self.cat_post])
+                self.assertEqual(posts.count(), 1)
+        response = self.guest_client.get(
+            reverse('posts:index'), {'search': 'мышки', 'order': 'date'}
+        )
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    def test_search_phrase(self):
+        """Проверяем поиск точной фразы в кавычках."""
+        Post.objects.create(text='мир спасут котики', author=self.user)
+        self.assertEqual(self.search('"котики спасут"'), [self.cat_post])
+
+    def test_search_top_k_pages(self):
+        """
+        Проверяем, что для страницы выбираются только нужные посты,
+        а ссылка на следующую страницу появляется по N * per_page + 1.
+        """
+        Post.objects.bulk_create(
+            Post(text=f'Попугай {i}', author=self.user)
+            for i in range(PAGE_NOTES_LIMIT * 2 + 5)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.guest_client.get(
+            reverse('posts:index'), {'search': 'попугай'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), PAGE_NOTES_LIMIT)
+        self.assertEqual(page_obj.paginator.count, PAGE_NOTES_LIMIT + 1)
+        self.assertTrue(page_obj.has_next())
+        self.assertContains(response, 'search=%D0%BF')
+        response = self.guest_client.get(
+            reverse('posts:index'), {'search': 'попугай', 'page': 100}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual(len(page_obj), 5)
+        self.assertFalse(page_obj.has_next())
+        with override_settings(POSTS_SEARCH_MAX_PAGES=2):
+            response = self.guest_client.get(
+                reverse('posts:index'), {'search': 'попугай', 'page': 99}
+            )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 2)
+        self.assertTrue(page_obj.has_next())
+
+
+class SearchQueryTests(SimpleTestCase):
+    """Тестируем разбор поискового запроса."""
+
+    def test_parse(self):
+        """Проверяем разбор ключей, фраз и слов."""
+        query = SearchQuery.parse(
+            'author:leo group:"cats" after:2022-06-01 before:oops '
+            '"Точная  фраза" http://x слово'
+        )
+        self.assertEqual(query.authors, ['leo'])
+        self.assertEqual(query.groups, ['cats'])
+        self.assertEqual(query.after.date(), date(2022, 6, 1))
+        self.assertIsNone(query.before)
+        self.assertEqual(query.phrases, [['точная', 'фраза']])
+        self.assertEqual(query.terms, ['http', 'x', 'слово'])
+        self.assertEqual(
+            SQLiteFTSBackend.build_match(query),
+            '"http"* "x"* "слово"* "точная фраза"',
+        )
+
+    def test_parse_filters_only(self):
+        """Проверяем запрос без текстовой части."""
+        query = SearchQuery.parse('author:leo')
+        self.assertFalse(query.has_text)
+        self.assertEqual(query.authors, ['leo'])
+        self.assertEqual(query.words, [])
+
+
+class BM25Tests(SimpleTestCase):
+    """Тестируем ранжирование BM25 без базы данных."""
+
+    def test_bm25_top_k(self):
+        """Проверяем порядок и ограничение выдачи bm25_top_k."""
+        documents = [
+            (1, 'кот'),
+            (2, 'кот кот кот'),
+            (3, 'собака и кот'),
+            (4, 'собака'),
+        ]
+        self.assertEqual(bm25_top_k(documents, ['кот'], 4, 2), [2, 1])
+        self.assertEqual(bm25_top_k(documents, ['кот'], 4, 10)[-1], 4)
+        self.assertEqual(bm25_top_k([], ['кот'], 4, 10), [])
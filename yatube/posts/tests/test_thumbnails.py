@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from core.templatetags.post_cards import post_cards
+from ..models import Post
+from ..thumbnails import (
+    THUMBNAIL_GEOMETRIES, backend, get_thumbnail, get_thumbnails, variants
+)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def make_gif(color):
+    """Другой GIF 1x1 заданного цвета."""
+    buffer = BytesIO()
+    Image.new('RGB', (1, 1), color).save(buffer, format='GIF')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TransactionTestCase):
+    """Тестируем фоновое создание миниатюр."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.client.force_login(self.user)
+
+    def test_lookup_does_not_generate(self):
+        """Шаблон без готовой миниатюры показывает оригинал."""
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        self.assertIsNone(get_thumbnail(post.image, 'card'))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, post.image.url)
+        self.assertIsNone(get_thumbnail(post.image, 'detail'))
+
+    @skipUnless(
+        hasattr(Image, 'ANTIALIAS'),
+        'sorl-thumbnail 12.7 требует Pillow < 10 (см. requirements.txt)',
+    )
+    def test_create_queues_thumbnails(self):
+        """После создания поста готовы все миниатюры шаблонов."""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            },
+        )
+        post = Post.objects.get()
+        for alias in THUMBNAIL_GEOMETRIES:
+            with self.subTest(alias=alias):
+                self.assertIsNotNone(get_thumbnail(post.image, alias))
+        response = self.client.get(reverse('posts:index'))
+        thumbnail = get_thumbnail(post.image, 'card')
+        self.assertContains(response, thumbnail.url)
+        self.assertGreater(post.updated_at, post.pub_date)
+
+    def test_page_thumbnails_batched(self):
+        """Миниатюры карточек страницы ищутся одним запросом."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    f'small{number}.gif',
+                    make_gif(number),
+                    content_type='image/gif',
+                ),
+            )
+            for number in range(3)
+        ]
+        for width, _, geometry, options in variants('card'):
+            thumbnail = backend.thumbnail_file(
+                posts[0].image, geometry, **options
+            )
+            thumbnail.set_size(tuple(map(int, geometry.split('x'))))
+            default.kvstore.set(thumbnail)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails = get_thumbnails([post.image for post in posts], 'card')
+        with self.assertNumQueries(0):
+            cached = get_thumbnails([post.image for post in posts], 'card')
+        self.assertEqual(cached.keys(), thumbnails.keys())
+        responsive = thumbnails[posts[0].image.name]
+        self.assertEqual(responsive.width, 960)
+        self.assertEqual(len(responsive.files), len(list(variants('card'))))
+        self.assertIsNone(thumbnails[posts[1].image.name])
+        cache.clear()
+        with self.assertNumQueries(1):
+            cards = post_cards(posts)
+        self.assertIn(responsive.main_srcset, cards[posts[0].id])
+        self.assertIn('type="image/webp"', cards[posts[0].id])
+        self.assertIn('loading="lazy"', cards[posts[0].id])
+        self.assertIn(posts[1].image.url, cards[posts[1].id])
+
+    def test_bench_thumbnails(self):
+        """Бенчмарк печатает строку на каждый вариант миниатюры."""
+        Post.objects.create(
+            text='Тестовый пост',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        out = StringIO()
+        call_command(
+            'bench_thumbnails',
+            path=os.path.join(TEMP_MEDIA_ROOT, 'posts'),
+            stdout=out,
+        )
+        self.assertEqual(
+            len(out.getvalue().splitlines()), len(list(variants('card'))) + 1
+        )
+        self.assertIn('WEBP', out.getvalue())
@@ -0,0 +1,157 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+POSTS_QUANTITY: int = 5
+TIMELINE_LENGTH: int = 3
+
+
+class TimelineTests(TestCase):
+    """Тестируем материализованную ленту подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        for i in range(POSTS_QUANTITY):
+            Post.objects.create(text=f'Пост {i}', author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(TimelineTests.reader)
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.reader
+        ).values_list('post_id', flat=True))
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Подписка заполняет ленту, отписка очищает ее."""
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertEqual(
+            self.timeline(),
+            list(self.author.posts.values_list('id', flat=True)),
+        )
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertEqual(self.timeline(), [])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленту подписчика и на страницу ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Свежий пост', author=self.author)
+        self.assertEqual(self.timeline()[0], post.id)
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    @override_settings(POSTS_TIMELINE_LENGTH=TIMELINE_LENGTH)
+    def test_backfill_trims_timeline(self):
+        """При подписке в ленте остаются только самые новые записи."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            self.timeline(),
+            list(self.author.posts.values_list(
+                'id', flat=True
+            )[:TIMELINE_LENGTH]),
+        )
+
+    @override_settings(POSTS_TIMELINE_LENGTH=TIMELINE_LENGTH)
+    def test_fan_out_trims_timelines(self):
+        """Новый пост вытесняет из лент подписчиков самую старую запись."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='Свежий пост', author=self.author)
+        expected = list(self.author.posts.values_list(
+            'id', flat=True
+        )[:TIMELINE_LENGTH])
+        self.assertEqual(expected[0], post.id)
+        self.assertEqual(self.timeline(), expected)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(
+                user=other
+            ).values_list('post_id', flat=True)),
+            expected,
+        )
+
+    @override_settings(POSTS_FAN_OUT_FOLLOWER_LIMIT=0)
+    def test_popular_author_is_pulled_on_read(self):
+        """
+        Посты автора выше порога подписчиков не раскладываются по лентам,
+        а сливаются с материализованной лентой при чтении.
+        """
+        pushed_author = User.objects.create_user(username='pushed')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline(), [])
+        with override_settings(POSTS_FAN_OUT_FOLLOWER_LIMIT=1):
+            Follow.objects.create(user=self.reader, author=pushed_author)
+            pushed = Post.objects.create(text='Push', author=pushed_author)
+        pulled = Post.objects.create(text='Pull', author=self.author)
+        self.assertEqual(self.timeline(), [pushed.id])
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, POSTS_QUANTITY + 2)
+        self.assertEqual(page_obj[0], pulled)
+        self.assertEqual(page_obj[1], pushed)
+        self.assertEqual(
+            list(page_obj)[2:],
+            list(self.author.posts.all()[1:POSTS_QUANTITY + 1]),
+        )
+
+    @override_settings(POSTS_FAN_OUT_FOLLOWER_LIMIT=0)
+    def test_hybrid_feed_ignores_cursor(self):
+        """Гибридная лента нумеруется страницами даже с ?cursor=."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(
+            reverse('posts:follow_index'), {'cursor': 'abc'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertEqual(page_obj.paginator.count, POSTS_QUANTITY)
+
+    @override_settings(POSTS_FAN_OUT_FOLLOWER_LIMIT=1)
+    def test_author_crosses_fan_out_limit(self):
+        """
+        Пока автор выше порога, его посты не попадают в ленты; после
+        отписки до порога они раскладываются оставшимся подписчикам.
+        """
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Выше порога', author=self.author)
+        self.assertEqual(self.timeline(), [])
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            self.timeline(),
+            list(self.author.posts.values_list('id', flat=True)),
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, POSTS_QUANTITY + 1
+        )
+
+    def test_bench_feed(self):
+        """Бенчмарк ленты печатает строку на схему и откатывает данные."""
+        users_count = User.objects.count()
+        out = StringIO()
+        call_command(
+            'bench_feed', authors=3, readers=4, follows=2, posts=2,
+            samples=3, limit=2, distribution=['zipf'], stdout=out,
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertIn('read p99', out.getvalue())
+        self.assertEqual(User.objects.count(), users_count)
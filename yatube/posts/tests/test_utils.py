@@ -0,0 +1,162 @@
+from io import StringIO
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.templatetags.pagination import page_window
+from ..counts import EstimatedCount, count_posts
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+POSTS_QUANTITY: int = 12
+
+
+class CountPostsTests(TestCase):
+    """Тестируем стратегии подсчета постов для паджинатора."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_QUANTITY)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        # bulk_create не отправляет сигналы, счетчики пересчитываются явно.
+        call_command('recount', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(POSTS_PAGINATOR_COUNT='cached')
+    def test_cached_count_invalidation(self):
+        """
+        Проверяем, что кешированное количество не пересчитывается
+        и сбрасывается при создании и удалении поста.
+        """
+        keys = [
+            (Post.objects.all(), ('index', None)),
+            (self.group.posts.all(), ('group', self.group.id)),
+            (self.user.posts.all(), ('author', self.user.id)),
+            (
+                Post.objects.filter(author=self.user),
+                ('follow', self.reader.id),
+            ),
+        ]
+        for queryset, key in keys:
+            with self.subTest(key=key):
+                self.assertEqual(count_posts(queryset, key), POSTS_QUANTITY)
+                with self.assertNumQueries(0):
+                    count_posts(queryset, key)
+        post = Post.objects.create(
+            text='Новый пост', author=self.user, group=self.group
+        )
+        for queryset, key in keys:
+            with self.subTest(key=key):
+                self.assertEqual(
+                    count_posts(queryset, key), POSTS_QUANTITY + 1
+                )
+        post.delete()
+        for queryset, key in keys:
+            with self.subTest(key=key):
+                self.assertEqual(count_posts(queryset, key), POSTS_QUANTITY)
+
+    @override_settings(POSTS_PAGINATOR_COUNT='cached')
+    def test_cached_count_group_change(self):
+        """Проверяем сброс количества обеих групп при смене группы поста."""
+        another_group = Group.objects.create(
+            title='Другая группа', slug='another', description='-'
+        )
+        count_posts(self.group.posts.all(), ('group', self.group.id))
+        count_posts(another_group.posts.all(), ('group', another_group.id))
+        post = self.group.posts.first()
+        post.group = another_group
+        post.save()
+        self.assertEqual(
+            count_posts(self.group.posts.all(), ('group', self.group.id)),
+            POSTS_QUANTITY - 1,
+        )
+        self.assertEqual(
+            count_posts(
+                another_group.posts.all(), ('group', another_group.id)
+            ),
+            1,
+        )
+
+    def test_estimated_count(self):
+        """Проверяем оценку количества по sqlite_stat1."""
+        another_group = Group.objects.create(title='Другая', slug='another')
+        Post.objects.create(
+            text='Один пост', author=self.user, group=another_group
+        )
+        queryset = Post.objects.all()
+        estimate = EstimatedCount()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(
+            estimate(queryset, ('index', None)), POSTS_QUANTITY + 1
+        )
+        # Размер группы считается точно, а не средним по sqlite_stat1.
+        self.assertEqual(
+            estimate(another_group.posts.all(), ('group', another_group.id)),
+            1,
+        )
+        self.assertEqual(
+            estimate(self.group.posts.all(), ('group', self.group.id)),
+            POSTS_QUANTITY,
+        )
+        self.assertEqual(
+            estimate(queryset, ('unknown', None)), POSTS_QUANTITY + 1
+        )
+
+    @override_settings(POSTS_PAGINATOR_COUNT='cached')
+    def test_profile_single_count(self):
+        """Проверяем, что профиль не считает посты повторно."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        # Анонимные запросы отдаются из кеша страниц, поэтому
+        # рендеринг проверяется для авторизованного пользователя.
+        self.client.force_login(self.reader)
+        self.client.get(url)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.context['posts_count'], POSTS_QUANTITY)
+
+
+class PageWindowTests(SimpleTestCase):
+    """Тестируем ограниченное окно номеров страниц."""
+
+    @staticmethod
+    def page(number, num_pages):
+        return SimpleNamespace(
+            number=number,
+            paginator=SimpleNamespace(num_pages=num_pages),
+        )
+
+    def test_page_window(self):
+        """Проверяем номера страниц и пропуски в окне."""
+        cases = {
+            (1, 1): [1],
+            (1, 5): [1, 2, 3, 4, 5],
+            (1, 1000): [1, 2, 3, None, 1000],
+            (500, 1000): [1, None, 498, 499, 500, 501, 502, None, 1000],
+            (4, 1000): [1, 2, 3, 4, 5, 6, None, 1000],
+            (1000, 1000): [1, None, 998, 999, 1000],
+        }
+        for (number, num_pages), expected in cases.items():
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(
+                    page_window(self.page(number, num_pages)), expected
+                )
@@ -1,16 +1,21 @@
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.templatetags.post_cards import card_cache_key
+from ..generations import get_generation
 from ..models import Comment, Follow, Group, Post
-from ..utils import PAGE_NOTES_LIMIT
+from ..utils import COMMENTS_LIMIT, PAGE_NOTES_LIMIT
 
 User = get_user_model()
 
@@ -267,6 +272,59 @@ class PostViewsTests(TestCase):
             PAGE_NOTES_LIMIT
         )
 
+    def test_cursor_paginator(self):
+        """
+        Проверяем курсорную паджинацию: переход вперед и назад по
+        курсорам на всех списках и откат к первой странице при
+        поврежденном курсоре.
+        """
+        reverses = {
+            reverse('posts:index'): Post.objects.all(),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostViewsTests.group.slug}
+            ): PostViewsTests.group.posts.all(),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostViewsTests.user.username}
+            ): PostViewsTests.user.posts.all(),
+            reverse('posts:follow_index'): Post.objects.filter(
+                author=PostViewsTests.following_user
+            ),
+        }
+        for url, expected in reverses.items():
+            with self.subTest(url=url):
+                expected = list(expected)
+                seen = []
+                response = self.authorized_client_follower.get(
+                    url, {'cursor': ''}
+                )
+                page_obj = response.context['page_obj']
+                self.assertFalse(page_obj.has_previous())
+                self.assertContains(response, f'cursor={page_obj.next_cursor}')
+                first_page = list(page_obj)
+                while True:
+                    seen.extend(page_obj)
+                    if not page_obj.has_next():
+                        break
+                    response = self.authorized_client_follower.get(
+                        url, {'cursor': page_obj.next_cursor}
+                    )
+                    page_obj = response.context['page_obj']
+                self.assertEqual(seen, expected)
+                while page_obj.has_previous():
+                    response = self.authorized_client_follower.get(
+                        url, {'cursor': page_obj.previous_cursor}
+                    )
+                    page_obj = response.context['page_obj']
+                self.assertEqual(list(page_obj), first_page)
+                response = self.authorized_client_follower.get(
+                    url, {'cursor': 'не курсор'}
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']), first_page
+                )
+
     def test_correct_group(self):
         """
         Проверяем, что пост не попал в группу, для которой не был предназначен.
@@ -331,6 +389,49 @@ class PostViewsTests(TestCase):
         response_third = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(response_first.content, response_third.content)
 
+    def test_index_cache_generation(self):
+        """
+        Проверяем, что удаление поста через представление сбрасывает
+        только поколение своих областей, а не весь кеш.
+        """
+        test_post = Post.objects.get(id=LAST_POST_ID)
+        group_generation = get_generation('group', self.group_another.slug)
+        response_first = self.guest_client.get(reverse('posts:index'))
+        self.authorized_client_following.get(
+            reverse('posts:post_delete', kwargs={'post_id': test_post.id})
+        )
+        response_second = self.guest_client.get(reverse('posts:index'))
+        self.assertNotEqual(response_first.content, response_second.content)
+        self.assertNotIn(test_post, response_second.context['page_obj'])
+        self.assertEqual(
+            get_generation('group', self.group_another.slug), group_generation
+        )
+
+    def test_post_card_cache(self):
+        """
+        Проверяем, что карточки постов берутся из кеша и что изменение
+        поста обновляет только его карточку.
+        """
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        response = self.authorized_client.get(url)
+        posts = list(response.context['page_obj'])
+        keys = [card_cache_key(post) for post in posts]
+        cached = cache.get_many(keys)
+        self.assertEqual(len(cached), len(posts))
+        edited = posts[0]
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': edited.id}),
+            data={'text': 'Измененный текст', 'group': self.group.id},
+        )
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Измененный текст')
+        refreshed = response.context['page_obj'][0]
+        self.assertNotEqual(card_cache_key(refreshed), keys[0])
+        refreshed_keys = [
+            card_cache_key(post) for post in response.context['page_obj']
+        ]
+        self.assertEqual(refreshed_keys[1:], keys[1:])
+
     def test_profile_follow(self):
         """
         Проверяем подписку на и отписку от авторов.
@@ -402,3 +503,101 @@ class PostViewsTests(TestCase):
         )
         self.assertEqual(User.objects.count(), user_count - 1)
         self.assertRedirects(response, reverse('posts:index'))
+
+    def test_post_comments_pages(self):
+        """
+        Проверяем постраничную загрузку комментариев: количество запросов
+        не зависит от числа комментариев, продолжение отдает фрагмент.
+        """
+        post = Post.objects.create(text='Обсуждаемый пост', author=self.user)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        Comment.objects.create(post=post, author=self.user, text='Первый')
+        with CaptureQueriesContext(connection) as few:
+            self.authorized_client.get(url)
+        for i in range(COMMENTS_LIMIT):
+            Comment.objects.create(
+                post=post, author=self.follower_user, text=f'Ответ {i}'
+            )
+        with self.assertNumQueries(len(few.captured_queries)):
+            response = self.authorized_client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_LIMIT)
+        self.assertEqual(comments[FIRST_COMMENT].text, 'Первый')
+        self.assertTrue(comments.has_next())
+        response = self.authorized_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': post.id}),
+            {'comments': comments.next_cursor},
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Ответ {COMMENTS_LIMIT - 1}'],
+        )
+        self.assertNotContains(response, 'data-more-comments')
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': post.id + 1})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_comment_replies(self):
+        """
+        Проверяем, что ответ на комментарий выводится сразу после него
+        с отступом, а поддерево выбирается одним запросом.
+        """
+        post = Post.objects.create(text='Пост с веткой', author=self.user)
+        first = Comment.objects.create(
+            post=post, author=self.user, text='Первый'
+        )
+        second = Comment.objects.create(
+            post=post, author=self.user, text='Второй'
+        )
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Ответ на первый', 'parent': first.id},
+        )
+        reply = Comment.objects.get(text='Ответ на первый')
+        self.assertEqual(reply.parent, first)
+        self.assertEqual(reply.depth, 1)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertEqual(
+            list(response.context['comments']), [first, reply, second]
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(list(first.subtree()), [first, reply])
+
+    def test_comment_previews(self):
+        """
+        Проверяем, что карточки показывают количество и два последних
+        комментария, выбранных для всей страницы одним запросом.
+        """
+        cache.clear()
+        posts = Post.objects.all()[:3]
+        for post in posts:
+            for i in range(3):
+                Comment.objects.create(
+                    post=post, author=self.follower_user, text=f'Превью {i}'
+                )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        comment_queries = [
+            query for query in queries.captured_queries
+            if 'posts_comment' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        content = response.content.decode()
+        self.assertEqual(content.count('Превью 2'), len(posts))
+        self.assertEqual(content.count('Превью 1'), len(posts))
+        self.assertNotIn('Превью 0', content)
+        self.assertIn('Комментариев: 3', content)
+        # Удаление и новый комментарий не меняют количество, но меняют
+        # превью.
+        post = posts[0]
+        post.comments.order_by('-id').first().delete()
+        Comment.objects.create(
+            post=post, author=self.follower_user, text='Новое превью'
+        )
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[post.author.username])
+        )
+        self.assertContains(response, 'Новое превью', count=1)
@@ -0,0 +1,46 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class WarmCacheTests(TransactionTestCase):
+    """Тестируем прогрев кеша."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(text='Тестовый пост', author=author, group=group)
+        Follow.objects.create(user=reader, author=author)
+
+    def test_warm_cache(self):
+        """Команда рендерит приоритетные страницы и заполняет кеш."""
+        out = StringIO()
+        call_command(
+            'warm_cache', pages=2, groups=1, profiles=1, workers=2,
+            verbosity=2, stdout=out,
+        )
+        output = out.getvalue()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIn(f'200 {url}\n', output)
+                self.assertIsNone(self.client.get(url).context)
+        self.assertIn('Прогрето страниц: 4', output)
@@ -0,0 +1,264 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WORKERS: int = 2
+
+# Все миниатюры, которые показывают шаблоны: имя -> (геометрия, опции).
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('960x500', {'crop': 'center', 'upscale': True}),
+}
+# Ширины вариантов для srcset и их форматы с MIME-типами для <source>.
+THUMBNAIL_WIDTHS: tuple = (480, 720, 960)
+THUMBNAIL_FORMATS = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+THUMBNAIL_SIZES: str = '(max-width: 960px) 100vw, 960px'
+MAIN_FORMAT: str = 'JPEG'
+
+_executor = None
+
+
+def variants(alias):
+    """
+    Варианты миниатюры alias: (ширина, формат, геометрия, опции).
+    Пропорции у всех вариантов как у основной геометрии.
+    """
+    geometry, options = THUMBNAIL_GEOMETRIES[alias]
+    width, height = map(int, geometry.split('x'))
+    for variant_width in THUMBNAIL_WIDTHS:
+        if variant_width > width:
+            continue
+        variant_height = round(height * variant_width / width)
+        for format_ in THUMBNAIL_FORMATS:
+            yield (
+                variant_width,
+                format_,
+                f'{variant_width}x{variant_height}',
+                {**options, 'format': format_},
+            )
+
+
+class ResponsiveThumbnail:
+    """
+    Готовые варианты миниатюры одного изображения для <picture>:
+    src - самый широкий JPEG, srcset - все ширины каждого формата.
+    """
+
+    sizes = THUMBNAIL_SIZES
+
+    def __init__(self, files):
+        self.files = files
+
+    @property
+    def main(self):
+        width = max(
+            width for width, format_ in self.files if format_ == MAIN_FORMAT
+        )
+        return self.files[width, MAIN_FORMAT]
+
+    @property
+    def url(self):
+        return self.main.url
+
+    @property
+    def width(self):
+        return self.main.width
+
+    @property
+    def height(self):
+        return self.main.height
+
+    def srcset(self, format_):
+        return ', '.join(
+            f'{thumbnail.url} {width}w'
+            for (width, variant_format), thumbnail in sorted(
+                self.files.items()
+            )
+            if variant_format == format_
+        )
+
+    @property
+    def sources(self):
+        """(MIME-тип, srcset) дополнительных форматов для <source>."""
+        return [
+            (mime_type, self.srcset(format_))
+            for format_, mime_type in THUMBNAIL_FORMATS.items()
+            if format_ != MAIN_FORMAT and self.srcset(format_)
+        ]
+
+    @property
+    def main_srcset(self):
+        return self.srcset(MAIN_FORMAT)
+
+
+class LookupBackend(ThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, который только ищет готовую миниатюру
+    в kvstore и никогда не создает ее.
+    """
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Миниатюра с тем же именем, что дал бы get_thumbnail."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(thumbnail_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        thumbnail = self.thumbnail_file(file_, geometry_string, **options)
+        return default.kvstore.get(thumbnail)
+
+
+backend = LookupBackend()
+
+
+def get_thumbnail(image, alias):
+    """Готовая миниатюра alias для image или None."""
+    if not image:
+        return None
+    return get_thumbnails([image], alias)[image.name]
+
+
+def _lookup_variants(images, alias):
+    """Готовые варианты всех изображений: {(имя, ширина, формат): файл}."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        found = {}
+        for image in images:
+            for width, format_, geometry, options in variants(alias):
+                thumbnail = backend.lookup(image, geometry, **options)
+                if thumbnail is not None:
+                    found[image.name, width, format_] = thumbnail
+        return found
+    empty = cached_db_kvstore.EMPTY_VALUE
+    keys = {
+        add_prefix(backend.thumbnail_file(image, geometry, **options).key):
+            (image.name, width, format_)
+        for image in images
+        for width, format_, geometry, options in variants(alias)
+    }
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        # Как и kvstore, запоминаем отсутствие записи, чтобы не ходить в БД.
+        fetched = {key: found.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    return {
+        variant: deserialize_image_file(values[key])
+        for key, variant in keys.items() if values[key] != empty
+    }
+
+
+def get_thumbnails(images, alias):
+    """
+    Готовые миниатюры alias для нескольких изображений сразу, словарь
+    {имя изображения: ResponsiveThumbnail или None}. Записи kvstore всех
+    вариантов читаются из кеша одним get_many, промахи - одним запросом
+    к БД. Без основного JPEG миниатюра считается неготовой.
+    """
+    images = [image for image in images if image]
+    files = {image.name: {} for image in images}
+    for (name, width, format_), thumbnail in _lookup_variants(
+        images, alias
+    ).items():
+        files[name][width, format_] = thumbnail
+    return {
+        name: (
+            ResponsiveThumbnail(variant_files)
+            if any(format_ == MAIN_FORMAT for _, format_ in variant_files)
+            else None
+        )
+        for name, variant_files in files.items()
+    }
+
+
+def generate_thumbnails(name, post_id=None):
+    """
+    Создает все варианты всех миниатюр изображения. Затем обновляет
+    updated_at поста, чтобы кеши карточек и страниц перестали отдавать
+    версию без миниатюр.
+    """
+    from .models import Post
+    # Ключи kvstore зависят от хранилища, поэтому берем хранилище поля.
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    for alias in THUMBNAIL_GEOMETRIES:
+        for _, _, geometry, options in variants(alias):
+            default.backend.get_thumbnail(source, geometry, **options)
+    if post_id is not None:
+        Post.objects.filter(id=post_id).update(updated_at=timezone.now())
+
+
+def _init_worker():
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            'Не удалось создать миниатюры', exc_info=future.exception()
+        )
+
+
+def get_executor():
+    """
+    Общий пул процессов для миниатюр. POSTS_THUMBNAIL_WORKERS = 0
+    отключает пул: миниатюры создаются в текущем процессе.
+    """
+    global _executor
+    workers = getattr(settings, 'POSTS_THUMBNAIL_WORKERS', THUMBNAIL_WORKERS)
+    if not workers:
+        return None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker
+        )
+    return _executor
+
+
+def submit_thumbnails(name, post_id=None):
+    """Отправляет создание миниатюр изображения в пул процессов."""
+    executor = get_executor()
+    if executor is None:
+        generate_thumbnails(name, post_id)
+    else:
+        executor.submit(
+            generate_thumbnails, name, post_id
+        ).add_done_callback(_log_failure)
+
+
+def queue_thumbnails(post):
+    """Ставит создание миниатюр поста в очередь после коммита."""
+    if not post.image:
+        return
+    name, post_id = post.image.name, post.id
+    transaction.on_commit(lambda: submit_thumbnails(name, post_id))
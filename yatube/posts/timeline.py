@@ -0,0 +1,210 @@
+import heapq
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Follow, Post, TimelineEntry, User, UserStats
+
+TIMELINE_LENGTH: int = 1000
+FAN_OUT_BATCH_SIZE: int = 500
+FAN_OUT_FOLLOWER_LIMIT: int = 1000
+
+
+def timeline_length():
+    """Сколько последних постов хранится в ленте одного читателя."""
+    return getattr(settings, 'POSTS_TIMELINE_LENGTH', TIMELINE_LENGTH)
+
+
+def fan_out_limit():
+    """
+    Порог подписчиков: посты авторов, у которых подписчиков больше,
+    не раскладываются по лентам, а подмешиваются при чтении.
+    """
+    return getattr(
+        settings, 'POSTS_FAN_OUT_FOLLOWER_LIMIT', FAN_OUT_FOLLOWER_LIMIT
+    )
+
+
+def is_pulled(author_id):
+    """Читаются ли посты автора при показе ленты (pull)."""
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__gt=fan_out_limit()
+    ).exists()
+
+
+def pulled_authors(user_id):
+    """Авторы из подписок пользователя, чьи посты читаются при показе."""
+    return list(UserStats.objects.filter(
+        user_id__in=Follow.objects.filter(user_id=user_id).values('author_id'),
+        followers_count__gt=fan_out_limit(),
+    ).values_list('user_id', flat=True))
+
+
+def fan_out(post):
+    """
+    Раскладывает новый пост в ленты всех подписчиков автора и обрезает
+    эти ленты до timeline_length() пачками по FAN_OUT_BATCH_SIZE.
+    Посты авторов выше fan_out_limit() не раскладываются.
+    """
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator()
+    while True:
+        user_ids = list(islice(followers, FAN_OUT_BATCH_SIZE))
+        if not user_ids:
+            return
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, post=post, pub_date=post.pub_date
+                )
+                for user_id in user_ids
+            ),
+            ignore_conflicts=True,
+        )
+        trim(*user_ids)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )[:timeline_length()]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        batch_size=FAN_OUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def push_author(author_id):
+    """
+    Автор опустился до fan_out_limit() подписчиков: пока он был выше
+    порога, его посты не раскладывались по лентам, поэтому последние
+    посты добавляются в ленты всех оставшихся подписчиков.
+    """
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__in=Post.objects.filter(author_id=author_id).values('id'),
+    ).delete()
+
+
+def trim(*user_ids):
+    """
+    Оставляет в лентах читателей только timeline_length() самых новых
+    записей. Два запроса на любое число читателей: граница каждой ленты
+    (последняя сохраняемая запись) ищется подзапросом по индексу ленты,
+    лишние записи удаляются условиями по диапазону этого индекса.
+    """
+    length = timeline_length()
+    entries = TimelineEntry.objects.filter(
+        user_id=OuterRef('pk')
+    ).order_by('-pub_date', '-post_id')
+    bounds = User.objects.filter(id__in=user_ids).annotate(
+        kept_date=Subquery(entries.values('pub_date')[length - 1:length]),
+        kept_post=Subquery(entries.values('post_id')[length - 1:length]),
+    ).exclude(kept_date=None).values_list('id', 'kept_date', 'kept_post')
+    condition = Q()
+    for user_id, pub_date, post_id in bounds:
+        condition |= Q(user_id=user_id, pub_date__lt=pub_date) | Q(
+            user_id=user_id, pub_date=pub_date, post_id__lt=post_id
+        )
+    if condition:
+        TimelineEntry.objects.filter(condition).delete()
+
+
+def rebuild(user_id):
+    """Заново заполняет ленту читателя постами авторов из push-части."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(
+        author_id__in=Follow.objects.filter(
+            user_id=user_id
+        ).values('author_id')
+    ).exclude(
+        author_id__in=pulled_authors(user_id)
+    ).values_list('id', 'pub_date')[:timeline_length()]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        batch_size=FAN_OUT_BATCH_SIZE,
+    )
+
+
+class FollowFeed:
+    """
+    Лента подписок, собранная из двух частей: материализованной ленты
+    (push) и последних постов популярных авторов (pull). Для среза
+    [start:stop] из каждого источника берется не больше stop пар
+    (pub_date, id), потоки сливаются кучей (k-way merge), и только
+    посты нужной страницы читаются из базы.
+    """
+
+    model = Post
+
+    def __init__(self, user_id, pulled, queryset=None):
+        self.user_id = user_id
+        self.pulled = list(pulled)
+        self.queryset = Post.objects.all() if queryset is None else queryset
+
+    def count(self):
+        return self.queryset.filter(
+            Q(id__in=TimelineEntry.objects.filter(
+                user_id=self.user_id
+            ).values('post_id'))
+            | Q(author_id__in=self.pulled)
+        ).count()
+
+    def streams(self, limit):
+        """Отсортированные по убыванию потоки (pub_date, id) постов."""
+        yield TimelineEntry.objects.filter(
+            user_id=self.user_id
+        ).values_list('pub_date', 'post_id')[:limit]
+        for author_id in self.pulled:
+            yield Post.objects.filter(
+                author_id=author_id
+            ).values_list('pub_date', 'id')[:limit]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        merged = heapq.merge(*self.streams(stop), reverse=True)
+        ids = [
+            post_id for _, post_id in
+            islice((row for row, _ in groupby(merged)), start, stop)
+        ]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def follow_feed(user_id, queryset):
+    """
+    Посты ленты подписок пользователя. Если среди подписок нет авторов
+    выше fan_out_limit(), лента целиком читается из TimelineEntry.
+    """
+    pulled = pulled_authors(user_id)
+    if pulled:
+        return FollowFeed(user_id, pulled, queryset)
+    return queryset.filter(timeline_entries__user_id=user_id).order_by(
+        '-timeline_entries__pub_date', '-timeline_entries__post__id'
+    )
@@ -1,11 +1,260 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.core.exceptions import ValidationError
+from django.db.models import OuterRef, Q, QuerySet, Subquery
+from django.utils.functional import cached_property
+
+from .counts import count_posts
+from .models import Comment, Post
+from .search import RankedResults
 
 PAGE_NOTES_LIMIT: int = 10
+CURSOR_ORDERING: tuple = ('-pub_date', '-id')
+COMMENTS_LIMIT: int = 20
+COMMENTS_ORDERING: tuple = ('path', 'id')
+COMMENT_PREVIEWS: int = 2
+SEARCH_MAX_PAGES: int = 50
+
+
+class CountedPaginator(Paginator):
+    """
+    Паджинатор, получающий общее количество через count_posts:
+    точно, из кеша или по статистике, в зависимости от настроек.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return count_posts(self.object_list, self.count_key)
+
+
+class TopKPaginator(Paginator):
+    """
+    Паджинатор результатов, упорядоченных по релевантности.
+    Для страницы N выбирается только N * per_page + 1 лучших постов,
+    а количество совпадений целиком не считается: count показывает,
+    сколько результатов известно, и на одну страницу больше, если
+    следующая страница существует. Номер страницы ограничен
+    POSTS_SEARCH_MAX_PAGES, чтобы ?page= не задавал LIMIT произвольной
+    величины.
+    """
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.fetched = []
+
+    def get_page(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        number = min(number, getattr(
+            settings, 'POSTS_SEARCH_MAX_PAGES', SEARCH_MAX_PAGES
+        ))
+        self.fetched = self.object_list.top(number * self.per_page + 1)
+        try:
+            return self.page(number)
+        except InvalidPage:
+            return self.page(self.num_pages)
+
+    @property
+    def count(self):
+        return len(self.fetched)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.fetched[bottom:bottom + self.per_page], number, self
+        )
+
+
+class CursorPage(Page):
+    """
+    Страница курсорной паджинации.
+    Номер страницы не известен, вместо него есть курсоры соседних страниц.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, 1, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
 
+    def has_next(self):
+        return self.next_cursor is not None
 
-def paginator_form(request, posts):
-    """Форматирует паджинацию страницы."""
-    paginator = Paginator(posts, PAGE_NOTES_LIMIT)
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset-паджинация по упорядоченному набору уникальных полей
+    (по умолчанию (pub_date, id)). Страница выбирается условием
+    "после ключа последней строки" и LIMIT, без COUNT и OFFSET, поэтому
+    время выборки не зависит от глубины страницы. Курсор - непрозрачный
+    токен base64 с направлением и ключом граничной строки.
+    """
+
+    def __init__(self, object_list, per_page, ordering=CURSOR_ORDERING,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.ordering = tuple(ordering)
+        self.fields = [
+            object_list.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    @cached_property
+    def count(self):
+        """Количество строк на странице: общий COUNT не выполняется."""
+        return len(self.object_list)
+
+    def encode_cursor(self, direction, obj):
+        values = [field.value_to_string(obj) for field in self.fields]
+        raw = json.dumps([direction, values]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Возвращает (направление, значения ключа) или None, если курсор
+        пустой или поврежден.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+            if direction not in ('next', 'prev'):
+                return None
+            if len(values) != len(self.fields):
+                return None
+            return direction, [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+
+    def _after(self, values, backwards):
+        """Условие "строка идет после ключа values" в порядке ordering."""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != backwards
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def get_page(self, cursor):
+        position = self.decode_cursor(cursor or '')
+        backwards = position is not None and position[0] == 'prev'
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            )
+        queryset = self.object_list.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position[1], backwards))
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+        self.object_list = items
+        has_next = has_more if not backwards else True
+        has_previous = position is not None if not backwards else has_more
+        return CursorPage(
+            items,
+            self,
+            next_cursor=(
+                self.encode_cursor('next', items[-1])
+                if items and has_next else None
+            ),
+            previous_cursor=(
+                self.encode_cursor('prev', items[0])
+                if items and has_previous else None
+            ),
+        )
+
+
+def paginator_form(request, posts, count_key=None):
+    """
+    Форматирует паджинацию страницы.
+    Курсорный режим включается параметром ?cursor= в запросе или
+    настройкой POSTS_CURSOR_PAGINATION, иначе используется ?page=.
+    Списки, которые не являются QuerySet, всегда нумеруются страницами:
+    для гибридной ленты подписок (timeline.FollowFeed) ?cursor=
+    игнорируется, и без ?page= отдается первая страница. Ключи ее
+    потоков не сводятся к одному условию на QuerySet, а срез страницы
+    и так читает из каждого потока не больше stop строк.
+    count_key - ключ списка для count_posts, без него количество
+    считается точно.
+    """
+    cursor_mode = 'cursor' in request.GET or getattr(
+        settings, 'POSTS_CURSOR_PAGINATION', False
+    )
     page_number = request.GET.get('page')
+    if isinstance(posts, RankedResults):
+        paginator = TopKPaginator(posts, PAGE_NOTES_LIMIT)
+    elif cursor_mode and isinstance(posts, QuerySet):
+        paginator = CursorPaginator(posts, PAGE_NOTES_LIMIT)
+        page_number = request.GET.get('cursor')
+    else:
+        paginator = CountedPaginator(posts, PAGE_NOTES_LIMIT, count_key)
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def comments_page(request, comments):
+    """
+    Страница комментариев поста в порядке веток (по материализованному
+    пути) по курсору ?comments=: время выборки не зависит от их общего
+    количества.
+    """
+    paginator = CursorPaginator(
+        comments.select_related('author'),
+        COMMENTS_LIMIT,
+        ordering=COMMENTS_ORDERING,
+    )
+    return paginator.get_page(request.GET.get('comments'))
+
+
+def latest_comments(posts, limit=COMMENT_PREVIEWS):
+    """
+    Последние limit комментариев каждого поста одним запросом.
+    Подзапросы выбираются из постов страницы: i-й из них для каждого поста
+    берет id его i-го с конца комментария одним поиском по индексу
+    (post, -pub_date, -id), и внешний запрос читает комментарии по
+    первичному ключу. Посты без комментариев (по comments_count) не
+    запрашиваются. Возвращает {id поста: комментарии от старых к новым}.
+    """
+    post_ids = [post.id for post in posts if post.comments_count]
+    previews = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return previews
+    latest = Comment.objects.filter(
+        post_id=OuterRef('pk')
+    ).order_by('-pub_date', '-id').values('id')
+    condition = Q()
+    for position in range(limit):
+        condition |= Q(id__in=Post.objects.filter(id__in=post_ids).annotate(
+            comment_id=Subquery(latest[position:position + 1])
+        ).values('comment_id'))
+    comments = Comment.objects.filter(condition).select_related(
+        'author'
+    ).order_by('post_id', 'pub_date', 'id')
+    for comment in comments:
+        previews[comment.post_id].append(comment)
+    return previews
@@ -1,41 +1,51 @@
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
-from django.shortcuts import get_object_or_404, redirect, render
 from django.db.models import Q
+from django.shortcuts import get_object_or_404, redirect, render
 
+from .counters import get_user_stats
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator_form
+from .generations import bump, get_generation, post_scopes
+from .models import COMMENT_MAX_DEPTH, Comment, Follow, Group, Post, User
+from .page_cache import (
+    cache_anonymous_page, group_state, index_state, post_state, profile_state
+)
+from .search import RankedResults, SearchQuery, get_search_backend
+from .thumbnails import queue_thumbnails
+from .timeline import follow_feed
+from .utils import COMMENTS_ORDERING, comments_page, paginator_form
 
 CACHE_DURATION: int = 20
 
 
+@cache_anonymous_page(index_state)
 def index(request):
     """Главная страница."""
     posts = Post.objects.select_related('group', 'author')
     search_query = request.GET.get('search', '')
     if search_query:
-        posts = Post.objects.select_related('group', 'author').filter(
-            Q(text__icontains=search_query)
-            | Q(group__slug__icontains=search_query)
-            | Q(author__username__icontains=search_query)
-            | Q(author__first_name__icontains=search_query)
-            | Q(author__last_name__icontains=search_query)
-            | Q(pub_date__icontains=search_query)
-            | Q(comments__text__icontains=search_query)
-        )
-    page_obj = paginator_form(request, posts)
+        query = SearchQuery.parse(search_query)
+        posts = query.apply(posts)
+        if query.has_text and request.GET.get('order') == 'date':
+            posts = get_search_backend().filter(posts, query)
+        elif query.has_text:
+            posts = RankedResults(posts, query)
+        page_obj = paginator_form(request, posts)
+    else:
+        page_obj = paginator_form(request, posts, ('index', None))
     context = {
         'page_obj': page_obj,
+        'generation': get_generation('index'),
+        'cache_duration': CACHE_DURATION,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page(group_state)
 def group_posts(request, slug):
     """Все посты определенной группы."""
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    page_obj = paginator_form(request, posts)
+    page_obj = paginator_form(request, posts, ('group', group.id))
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -43,35 +53,59 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page(profile_state)
 def profile(request, username):
     """Страница пользователя."""
-    users = get_object_or_404(User, username=username)
+    users = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     posts = users.posts.select_related('group')
-    page_obj = paginator_form(request, posts)
+    stats = get_user_stats(users)
+    page_obj = paginator_form(request, posts, ('author', users.id))
     following = request.user.is_authenticated and request.user.follower.filter(
         author=users
     ).exists()
     context = {
         'users': users,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous_page(post_state)
 def post_detail(request, post_id):
     """Страница определенного поста."""
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('group', 'author__stats'), id=post_id
+    )
     form = CommentForm()
     context = {
         'post': post,
-        'comments': comments,
+        'author_stats': get_user_stats(post.author),
+        'comments': comments_page(
+            request, post.comments.order_by(*COMMENTS_ORDERING)
+        ),
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_anonymous_page(post_state)
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев поста."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {
+        'post_id': post.id,
+        'comments': comments_page(
+            request, post.comments.order_by(*COMMENTS_ORDERING)
+        ),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     """
@@ -83,6 +117,8 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        queue_thumbnails(post)
+        bump(*post_scopes(post))
         return redirect(
             'posts:profile',
             username=request.user.username
@@ -103,6 +139,7 @@ def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if post_id and post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
+    previous_scopes = post_scopes(post)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -110,6 +147,9 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            queue_thumbnails(post)
+        bump(*previous_scopes, *post_scopes(post))
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -118,30 +158,50 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+def reply_parent(post, parent_id):
+    """
+    Комментарий поста, на который отвечают, или None. Ответ на
+    комментарий максимальной глубины становится ответом на его родителя.
+    """
+    if not parent_id or not parent_id.isdigit():
+        return None
+    parent = Comment.objects.filter(post=post, id=parent_id).first()
+    if parent is not None and parent.depth + 1 >= COMMENT_MAX_DEPTH:
+        return parent.parent
+    return parent
+
+
 @login_required
 def add_comment(request, post_id):
     """
     Комментирование поста.
     Только для зарегистрированных пользователей.
     """
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('group'), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = reply_parent(post, request.POST.get('parent'))
         comment.save()
+        # Превью комментариев есть и в карточках списков с этим постом.
+        bump(*post_scopes(post))
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    """Посты авторов из подписок пользователя."""
+    """
+    Посты авторов из подписок пользователя.
+    Обычные авторы читаются из материализованной ленты (TimelineEntry),
+    популярные - из их последних постов, см. timeline.follow_feed.
+    """
     user = get_object_or_404(User, username=request.user.username)
-    posts = Post.objects.select_related('group', 'author').filter(
-        author__in=user.follower.values('author')
+    posts = follow_feed(
+        user.id, Post.objects.select_related('group', 'author')
     )
-    page_obj = paginator_form(request, posts)
+    page_obj = paginator_form(request, posts, ('follow', user.id))
     context = {
         'page_obj': page_obj,
     }
@@ -153,7 +213,11 @@ def profile_follow(request, username):
     """Подписка на автора."""
     author = get_object_or_404(User, username=username)
     if request.user.username != username:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+        if created:
+            bump(('author', author.id), ('author', request.user.id))
     return redirect('posts:profile', username=username)
 
 
@@ -164,6 +228,7 @@ def profile_unfollow(request, username):
     follow_qs = Follow.objects.filter(user=request.user, author=author)
     if follow_qs.exists():
         follow_qs.delete()
+        bump(('author', author.id), ('author', request.user.id))
     return redirect('posts:profile', username=username)
 
 
@@ -173,8 +238,9 @@ def post_delete(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
+    scopes = post_scopes(post)
     post.delete()
-    cache.clear()
+    bump(*scopes)
     return redirect('posts:index')
 
 
@@ -184,6 +250,27 @@ def user_delete(request, username):
     user = get_object_or_404(User, username=username)
     if user != request.user:
         return redirect('posts:profile', username=username)
+    group_slugs = Group.objects.filter(
+        posts__author=user
+    ).values_list('slug', flat=True).distinct()
+    commented = Comment.objects.filter(author=user).values_list(
+        'post_id', 'post__author_id', 'post__group__slug'
+    ).distinct()
+    related_users = Follow.objects.filter(
+        Q(user=user) | Q(author=user)
+    ).values_list('user_id', 'author_id')
+    scopes = [
+        ('index', None),
+        ('author', user.id),
+        *(('group', slug) for slug in group_slugs),
+        *(('post', post_id) for post_id, _, _ in commented),
+        *(('author', author_id) for _, author_id, _ in commented),
+        *(('group', slug) for _, _, slug in commented if slug),
+        *(
+            ('author', user_id)
+            for pair in related_users for user_id in pair
+        ),
+    ]
     user.delete()
-    cache.clear()
+    bump(*scopes)
     return redirect('posts:index')
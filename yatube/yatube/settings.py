@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -152,12 +156,47 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+CACHE_LOCATION = os.environ.get(
+    'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+)
+# Тесты (manage.py test и pytest) получают свой кеш во временном каталоге,
+# чтобы cache.clear() не стирал рабочий кеш и состояние не переходило
+# между запусками.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, CACHE_DIR, ignore_errors=True)
+    CACHE_LOCATION = os.path.join(CACHE_DIR, 'cache.sqlite3')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'L1_MAX_ENTRIES': 500,
+            # Чужие записи видны из L1 с задержкой до секунды.
+            'SYNC_INTERVAL': 1,
+        },
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+POSTS_SEARCH_BACKEND = 'posts.search.backends.SQLiteFTSBackend'
+
+POSTS_CURSOR_PAGINATION = False
+
+POSTS_PAGINATOR_COUNT = 'cached'
+
+POSTS_TIMELINE_LENGTH = 1000
+
+POSTS_FAN_OUT_FOLLOWER_LIMIT = 1000
+
+POSTS_THUMBNAIL_WORKERS = 2
+
+POSTS_IMAGE_MAX_SIZE = 2048
+
+POSTS_IMAGE_QUALITY = 85